@@ -5,8 +5,8 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('icon.icns', '.'), ('.env', '.')],
-    hiddenimports=[],
+    datas=[('icon.icns', '.'), ('.env', '.'), ('tiktoken_cache', 'tiktoken_cache')],
+    hiddenimports=['tiktoken_ext', 'tiktoken_ext.openai_public'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import office_processor
+from memory_profile import peak_rss_bytes
+from office_processor import get_report_path
+
+# 生成的测试文档中包含的错别字及其修改建议
+TYPOS = [("测式", "测试"), ("部份", "部分"), ("错别子", "错别字")]
+
+
+class OfflineClient:
+    """不联网的客户端：按 TYPOS 返回建议，基准只测量文档处理本身的内存"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, **kwargs):
+        text = messages[-1]["content"]
+        content = "\n".join(f"{original}|{suggestion}" for original, suggestion in TYPOS if original in text)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=len(text), completion_tokens=len(content),
+                                  prompt_tokens_details=None),
+        )
+
+
+def build_word(path, paragraph_count):
+    from docx import Document
+
+    doc = Document()
+    for index in range(paragraph_count):
+        paragraph = doc.add_paragraph()
+        paragraph.add_run(f"第{index+1}段：这里有一个测式，").bold = True
+        paragraph.add_run("以及一些普通文字和部份需要修改的内容。" * 3)
+    doc.save(path)
+
+
+def build_powerpoint(path, slide_count):
+    from pptx import Presentation
+
+    prs = Presentation()
+    for index in range(slide_count):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"第{index+1}页的测式标题"
+        slide.placeholders[1].text = "这里是正文内容，其中有错别子。\n第二行也有部份文字。"
+    prs.save(path)
+
+
+def measure_in_process(path):
+    """在当前进程中处理文档，输出处理前的峰值RSS和各阶段的内存使用（JSON）"""
+    # 先导入文档库，处理前的基准RSS中包含这部分内存
+    import docx
+    import pptx
+
+    office_processor.client = OfflineClient()
+    baseline_rss = peak_rss_bytes()
+    office_processor.process_document(path, memory_profile=True)
+    with open(get_report_path(path), encoding="utf-8") as f:
+        stages = json.load(f)["memory"]
+    print(json.dumps({"baseline_rss_bytes": baseline_rss, "children_peak_rss_bytes": peak_rss_bytes(children=True),
+                      "stages": stages}))
+
+
+def measure(path, rewrite_workers):
+    """在新进程中处理文档，返回 (峰值内存增长（字节）, 各阶段的内存使用)
+
+    lxml 的节点内存不经过 tracemalloc，因此优先使用进程峰值RSS相对处理前的增长，
+    并行重建段落时再加上进程池中最大的子进程峰值RSS；无法获取RSS时使用 tracemalloc 统计的峰值。
+    """
+    env = dict(os.environ, OFFICE_REWRITE_WORKERS=str(rewrite_workers))
+    output = subprocess.run([sys.executable, __file__, "--measure", str(path)],
+                            check=True, capture_output=True, text=True, env=env).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    stages = result["stages"]
+    if result["baseline_rss_bytes"] is not None:
+        peak = max(stage["peak_rss_bytes"] for stage in stages) - result["baseline_rss_bytes"]
+        peak += result["children_peak_rss_bytes"] or 0
+    else:
+        peak = max(stage["traced_peak_bytes"] for stage in stages)
+    return peak, stages
+
+
+def print_stages(stages):
+    for stage in stages:
+        rss = stage["peak_rss_bytes"]
+        rss_text = f"{rss / 2**20:.1f}MB" if rss is not None else "未知"
+        print(f"  {stage['stage']:<8} 峰值 {stage['traced_peak_bytes'] / 2**20:8.1f}MB  "
+              f"结束 {stage['traced_end_bytes'] / 2**20:8.1f}MB  进程峰值RSS {rss_text}  "
+              f"耗时 {stage['seconds']:.2f}秒")
+        for allocation in stage["top_allocations"][:3]:
+            print(f"           {allocation['size_diff_bytes'] / 2**20:+.1f}MB  {allocation['site']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量处理Word和PowerPoint文档各阶段的内存使用")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="生成的Word文档的段落数")
+    parser.add_argument("--slides", type=int, default=200, help="生成的演示文稿的幻灯片数")
+    parser.add_argument("--max-mb-per-1k-paragraphs", type=float, default=45,
+                        help="Word文档每1000段的峰值内存增长上限（MB），超过时以非零状态退出")
+    parser.add_argument("--max-mb-per-100-slides", type=float, default=12,
+                        help="演示文稿每100张幻灯片的峰值内存增长上限（MB），超过时以非零状态退出")
+    parser.add_argument("--rewrite-workers", type=int, default=1,
+                        help="重建段落的进程数（OFFICE_REWRITE_WORKERS），默认1：全部内存都在被测进程中，结果与CPU核数无关")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure_in_process(args.measure)
+        return
+
+    failures = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        word_path = Path(work_dir) / "benchmark.docx"
+        build_word(word_path, args.paragraphs)
+        peak, stages = measure(word_path, args.rewrite_workers)
+        per_1k = peak / 2**20 / (args.paragraphs / 1000)
+        print(f"Word文档（{args.paragraphs}段）: 每1000段峰值内存增长 {per_1k:.1f}MB")
+        print_stages(stages)
+        if per_1k > args.max_mb_per_1k_paragraphs:
+            failures.append(f"Word文档每1000段峰值内存增长 {per_1k:.1f}MB 超过上限 "
+                            f"{args.max_mb_per_1k_paragraphs}MB")
+
+        pptx_path = Path(work_dir) / "benchmark.pptx"
+        build_powerpoint(pptx_path, args.slides)
+        peak, stages = measure(pptx_path, args.rewrite_workers)
+        per_100 = peak / 2**20 / (args.slides / 100)
+        print(f"演示文稿（{args.slides}张幻灯片）: 每100张幻灯片峰值内存增长 {per_100:.1f}MB")
+        print_stages(stages)
+        if per_100 > args.max_mb_per_100_slides:
+            failures.append(f"演示文稿每100张幻灯片峰值内存增长 {per_100:.1f}MB 超过上限 "
+                            f"{args.max_mb_per_100_slides}MB")
+
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
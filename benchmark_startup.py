@@ -0,0 +1,60 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+MAIN_SCRIPT = Path(__file__).resolve().parent / "main.py"
+MARKER = "STARTUP_BENCHMARK window_shown"
+
+
+def measure_once(command):
+    """启动一次程序，返回从启动进程到窗口显示的时间（秒）和启动时加载的重型模块"""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        for line in process.stdout:
+            if line.startswith(MARKER):
+                elapsed = time.perf_counter() - start
+                heavy_modules = line.strip().split("heavy_modules=", 1)[1]
+                return elapsed, [name for name in heavy_modules.split(",") if name]
+    finally:
+        process.wait(timeout=30)
+    raise RuntimeError("程序没有输出窗口显示标记，请检查能否正常启动")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量程序启动到窗口显示的时间")
+    parser.add_argument("--runs", type=int, default=5, help="测量次数")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="启动时间中位数超过该值时以非零状态退出")
+    parser.add_argument("command", nargs="*",
+                        help="启动命令（例如打包后的可执行文件），默认使用当前解释器运行main.py")
+    args = parser.parse_args()
+
+    command = args.command or [sys.executable, str(MAIN_SCRIPT)]
+    command = command + ["--startup-benchmark"]
+
+    timings = []
+    heavy_modules = set()
+    for run in range(args.runs):
+        elapsed, modules = measure_once(command)
+        timings.append(elapsed)
+        heavy_modules.update(modules)
+        print(f"第{run+1}次: {elapsed:.3f}秒")
+
+    median = statistics.median(timings)
+    print(f"启动到窗口显示: 最短 {min(timings):.3f}秒，中位数 {median:.3f}秒，最长 {max(timings):.3f}秒")
+    if heavy_modules:
+        print(f"警告: 启动时加载了重型模块: {', '.join(sorted(heavy_modules))}")
+
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"启动时间中位数 {median:.3f}秒 超过上限 {args.max_seconds}秒")
+        sys.exit(1)
+    if heavy_modules:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被快速拒绝"""
+
+
+class CircuitBreaker:
+    """API调用熔断器
+
+    连续失败达到 failure_threshold 次后打开，之后的请求直接失败；
+    经过 reset_timeout 秒后进入半开状态，放行一个探测请求：
+    探测成功则关闭熔断器，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        if failure_threshold < 1:
+            raise ValueError("熔断阈值必须大于0")
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow_request(self):
+        """判断是否允许发送请求"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                # 到达重置时间，进入半开状态探测服务是否恢复
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            # 半开状态下同一时间只放行一个探测请求
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def check(self):
+        """不允许请求时抛出 CircuitOpenError"""
+        if not self.allow_request():
+            raise CircuitOpenError("API连续调用失败，熔断器已打开")
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"API连续失败 {self._failures} 次，熔断器打开")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
@@ -1,7 +1,7 @@
 import os
 import sys
 from pathlib import Path
-from dotenv import load_dotenv
+from dotenv import load_dotenv, dotenv_values
 
 def load_env_variables():
     """
@@ -33,61 +33,150 @@ def load_env_variables():
     print("警告: 未找到.env文件")
     return False
 
-def get_api_key():
+class AppConfig:
     """
-    获取API密钥，优先从环境变量获取，如果没有则返回空字符串
+    应用配置，从环境变量和.env文件中读取一次后缓存
+    """
+    DEFAULT_API_BASE_URL = "https://api.gptsapi.net/v1/"
+
+    def __init__(self, environ):
+        self.api_key = environ.get("OPENAI_API_KEY", "")
+        self.api_base_url = environ.get("OPENAI_API_BASE_URL") or self.DEFAULT_API_BASE_URL
+
+        # 对冲请求配置，未设置OPENAI_HEDGE_PERCENTILE时不启用对冲
+        self.hedge_settings = None
+        if environ.get("OPENAI_HEDGE_PERCENTILE"):
+            self.hedge_settings = {
+                "percentile": float(environ["OPENAI_HEDGE_PERCENTILE"]),
+                "max_hedge_ratio": float(environ.get("OPENAI_HEDGE_MAX_RATIO", "0.1")),
+                # 对冲请求可以发往另一个端点，未设置时使用主端点
+                "base_url": environ.get("OPENAI_HEDGE_BASE_URL") or None,
+                # 同时在途的主请求（以及对冲请求）的上限
+                "max_workers": max(int(environ.get("OPENAI_HEDGE_MAX_WORKERS", "32")), 1),
+            }
+
+        # 熔断器配置：连续失败多少次后熔断，以及熔断后多少秒重新探测
+        self.breaker_settings = {
+            "failure_threshold": int(environ.get("OPENAI_BREAKER_THRESHOLD", "5")),
+            "reset_timeout": float(environ.get("OPENAI_BREAKER_RESET_SECONDS", "30")),
+        }
+
+        # API请求的读取超时和连接超时（秒）以及客户端自动重试次数。端点无法连接时，熔断前最长等待约为
+        # 连续失败次数 ×（重试次数 + 1）× 连接超时；已连接但不返回时按读取超时计算
+        self.request_settings = {
+            "timeout": float(environ.get("OPENAI_TIMEOUT_SECONDS", "60")),
+            "connect_timeout": float(environ.get("OPENAI_CONNECT_TIMEOUT_SECONDS", "5")),
+            "max_retries": max(int(environ.get("OPENAI_MAX_RETRIES", "1")), 0),
+        }
+
+        # 每个文档（任务）的token预算，0 表示不限制
+        self.token_budget = int(environ.get("OPENAI_TOKEN_BUDGET", "0"))
+
+        # 是否记录各处理阶段的内存使用（会明显拖慢处理速度）
+        self.memory_profile = environ.get("OFFICE_MEMORY_PROFILE", "").lower() in ("1", "true", "yes", "on")
+
+        # 并行检查PowerPoint幻灯片的线程数，1 表示逐张处理
+        self.slide_workers = max(int(environ.get("OFFICE_SLIDE_WORKERS", "4")), 1)
+
+        # 并行重建段落最多使用的进程数，0 表示CPU核心数，1 表示不使用进程池（实际进程数按段落数估算）
+        self.rewrite_workers = int(environ.get("OFFICE_REWRITE_WORKERS", "0")) or os.cpu_count() or 1
+
+        # 术语表文件路径，未设置时不使用术语表
+        self.glossary_path = environ.get("OFFICE_GLOSSARY_FILE") or None
+
+
+_config = None
+
+def get_config():
+    """
+    获取应用配置，第一次调用时加载.env文件，之后直接返回缓存的配置
     """
+    global _config
+    if _config is not None:
+        return _config
+
     # 加载环境变量
     load_env_variables()
-    
-    # 从环境变量获取API密钥
-    api_key = os.environ.get("OPENAI_API_KEY", "")
-    
-    # 如果环境变量中没有API密钥，尝试从.env文件中直接读取
-    if not api_key:
+
+    # 环境变量优先；当前目录的.env文件中的值作为补充
+    environ = {}
+    env_path = Path('.env')
+    if env_path.exists():
         try:
-            # 尝试从当前目录的.env文件中读取
-            env_path = Path('.env')
-            if env_path.exists():
-                with open(env_path, 'r') as f:
-                    for line in f:
-                        if line.startswith('OPENAI_API_KEY='):
-                            api_key = line.strip().split('=', 1)[1]
-                            # 去除可能的引号
-                            api_key = api_key.strip('"\'')
-                            break
+            environ.update({key: value for key, value in dotenv_values(env_path).items() if value})
         except Exception as e:
             print(f"读取.env文件出错: {e}")
-    
-    return api_key
+    environ.update({key: value for key, value in os.environ.items() if value})
+
+    _config = AppConfig(environ)
+    return _config
+
+def get_api_key():
+    """
+    获取API密钥，优先从环境变量获取，如果没有则返回空字符串
+    """
+    return get_config().api_key
 
 def get_api_base_url():
     """
     获取API基础URL，优先从环境变量获取，如果没有则返回默认值
     """
-    # 加载环境变量
-    load_env_variables()
-    
-    # 从环境变量获取API基础URL，如果没有则使用默认值
-    api_base_url = os.environ.get("OPENAI_API_BASE_URL", "https://api.gptsapi.net/v1/")
-    
-    # 如果环境变量中没有API基础URL，尝试从.env文件中直接读取
-    if api_base_url == "https://api.gptsapi.net/v1/":
-        try:
-            # 尝试从当前目录的.env文件中读取
-            env_path = Path('.env')
-            if env_path.exists():
-                with open(env_path, 'r') as f:
-                    for line in f:
-                        if line.startswith('OPENAI_API_BASE_URL='):
-                            api_base_url = line.strip().split('=', 1)[1]
-                            # 去除可能的引号
-                            api_base_url = api_base_url.strip('"\'')
-                            break
-        except Exception as e:
-            print(f"读取.env文件出错: {e}")
-    
-    return api_base_url
+    return get_config().api_base_url
+
+def get_hedge_settings():
+    """
+    获取对冲请求配置，未设置OPENAI_HEDGE_PERCENTILE时返回None（不启用对冲）
+    """
+    return get_config().hedge_settings
+
+def get_breaker_settings():
+    """
+    获取熔断器配置：连续失败多少次后熔断，以及熔断后多少秒重新探测
+    """
+    return get_config().breaker_settings
+
+def get_request_settings():
+    """
+    获取创建OpenAI客户端时使用的超时（openai.Timeout，即 httpx.Timeout：连接超时较短、读取超时较长）
+    和自动重试次数
+    """
+    from openai import Timeout
+
+    settings = get_config().request_settings
+    return {
+        "timeout": Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+        "max_retries": settings["max_retries"],
+    }
+
+def get_token_budget():
+    """
+    获取每个文档（任务）的token预算，0 表示不限制
+    """
+    return get_config().token_budget
+
+def get_memory_profile():
+    """
+    获取是否记录各处理阶段的内存使用
+    """
+    return get_config().memory_profile
+
+def get_slide_workers():
+    """
+    获取并行检查PowerPoint幻灯片的线程数
+    """
+    return get_config().slide_workers
+
+def get_rewrite_workers():
+    """
+    获取并行重建段落最多使用的进程数
+    """
+    return get_config().rewrite_workers
+
+def get_glossary_path():
+    """
+    获取术语表文件路径，未设置时返回None
+    """
+    return get_config().glossary_path
 
 # 测试代码
 if __name__ == "__main__":
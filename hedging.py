@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class HedgePolicy:
+    """对冲请求策略
+
+    请求在超过历史延迟的指定百分位后仍未完成时，再发送一个重复请求（可以发往另一个端点），
+    取先返回的结果，另一个请求被取消。对冲比例受 max_hedge_ratio 限制，避免放大API负载。
+
+    主请求和对冲请求在各自的线程池中执行，对冲请求不会排在它要竞速的慢请求后面。
+    max_workers 是每个线程池的线程数上限，应不小于同时调用 call 的线程数，否则多出的主请求需要排队。
+    """
+
+    def __init__(self, percentile=95, max_hedge_ratio=0.1, min_samples=20,
+                 window_size=200, min_delay=0.5, max_workers=32):
+        if not 0 < percentile < 100:
+            raise ValueError("对冲百分位必须在0到100之间")
+        if not 0 <= max_hedge_ratio <= 1:
+            raise ValueError("对冲比例上限必须在0到1之间")
+
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self._latencies = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="request")
+        self._hedge_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+        # 统计计数
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def record_latency(self, seconds):
+        """记录一次已完成请求的耗时"""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self):
+        """返回发送对冲请求前的等待时间，样本不足时返回None（不对冲）"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    def _try_reserve_hedge(self):
+        """在对冲比例上限内预留一次对冲"""
+        with self._lock:
+            if self.hedges_fired + 1 > self.requests * self.max_hedge_ratio:
+                return False
+            self.hedges_fired += 1
+            return True
+
+    def _timed(self, func):
+        start = time.monotonic()
+        result = func()
+        return result, time.monotonic() - start
+
+    def call(self, primary, secondary=None, on_discarded=None):
+        """执行请求，必要时发送对冲请求
+
+        primary 和 secondary 都是无参可调用对象，secondary 为空时重复调用 primary。
+        发送了对冲请求时，未被采用的请求仍会执行完并计费：它成功完成后（可能在 call 返回之后），
+        在执行它的线程中以其结果调用 on_discarded。
+        """
+        with self._lock:
+            self.requests += 1
+
+        first = self._executor.submit(self._timed, primary)
+        delay = self.hedge_delay()
+
+        if delay is not None:
+            done, _ = wait([first], timeout=delay)
+            if not done and self._try_reserve_hedge():
+                hedge = self._hedge_executor.submit(self._timed, secondary or primary)
+                return self._race(first, hedge, on_discarded)
+
+        result, elapsed = first.result()
+        self.record_latency(elapsed)
+        return result
+
+    def _race(self, first, hedge, on_discarded=None):
+        """等待两个请求中先成功的一个，另一个被取消"""
+        pending = {first, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+
+                # 已在运行的请求无法中断，只能丢弃其结果
+                for loser in pending:
+                    if not loser.cancel() and on_discarded is not None:
+                        loser.add_done_callback(lambda f: self._report_discarded(f, on_discarded))
+
+                result, elapsed = future.result()
+                self.record_latency(elapsed)
+                if future is hedge:
+                    with self._lock:
+                        self.hedges_won += 1
+                return result
+        raise error
+
+    @staticmethod
+    def _report_discarded(future, on_discarded):
+        if future.cancelled() or future.exception() is not None:
+            return
+        result, _ = future.result()
+        on_discarded(result)
+
+    def stats(self):
+        """返回对冲统计信息"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+            }
@@ -0,0 +1,338 @@
+from pathlib import Path
+
+from PyQt5.QtCore import (Qt, QThread, QObject, QTimer, QAbstractTableModel, QModelIndex,
+                          pyqtSignal, pyqtSlot)
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyleOptionProgressBar, QApplication, QStyle
+
+from worker_process import (WorkerProcess, MESSAGE_PROGRESS, MESSAGE_RESULT, MESSAGE_DONE,
+                            MESSAGE_CANCELLED)
+
+# 支持的文件格式
+SUPPORTED_EXTENSIONS = (".docx", ".pptx", ".xlsx")
+
+# 任务状态
+STATUS_PENDING = "等待中"
+STATUS_RUNNING = "处理中"
+STATUS_CANCELLING = "正在取消"
+STATUS_DONE = "已完成"
+STATUS_CANCELLED = "已取消"
+STATUS_ERROR = "出错"
+
+# 结果状态的显示文本
+RESULT_STATUS_TEXT = {
+    "suggested": "建议",
+    "unchecked": "未检查",
+    "unanchored": "未定位",
+    "glossary": "术语保留",
+}
+
+
+def collect_office_files(paths):
+    """展开文件和文件夹，返回其中支持的Office文件（跳过本工具生成的文件和临时文件）"""
+    files = []
+    for path in paths:
+        path = Path(path)
+        candidates = sorted(path.rglob("*")) if path.is_dir() else [path]
+        for candidate in candidates:
+            if not candidate.is_file() or candidate.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            if candidate.name.startswith("~$") or candidate.stem.endswith("_修订"):
+                continue
+            files.append(candidate)
+    return files
+
+
+class ProcessThread(QThread):
+    """在后台线程中等待工作进程的消息，并转发为Qt信号
+
+    文档处理在独立的工作进程中进行，本线程只负责读取消息队列。
+    """
+
+    finished = pyqtSignal(str, int)  # 输出文件路径和使用的token数
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    progress = pyqtSignal(int, str)  # 进度百分比和当前处理的内容
+    result = pyqtSignal(str, str, str, str)  # 位置、原文、建议、状态
+
+    def __init__(self, file_path, report_only=False, annotation_mode="inline", partial_interval=None):
+        super().__init__()
+        self.file_path = file_path
+        self.worker = WorkerProcess(file_path, report_only=report_only,
+                                    annotation_mode=annotation_mode,
+                                    partial_interval=partial_interval)
+
+    def cancel(self):
+        self.worker.cancel()
+
+    def kill(self):
+        """立即结束工作进程，不等待当前文本单元处理完"""
+        self.worker.terminate()
+
+    def run(self):
+        try:
+            self.worker.start()
+        except Exception as e:
+            self.error.emit(f"无法启动处理进程: {e}")
+            return
+
+        try:
+            for message in self.worker.iter_messages():
+                message_type = message["type"]
+                if message_type == MESSAGE_PROGRESS:
+                    self.progress.emit(message["percent"], message["message"])
+                elif message_type == MESSAGE_RESULT:
+                    self.result.emit(message["location"], message["original"],
+                                     message["suggestion"], message["status"])
+                elif message_type == MESSAGE_DONE:
+                    self.finished.emit(message["output_path"], message["tokens"])
+                elif message_type == MESSAGE_CANCELLED:
+                    self.cancelled.emit()
+                else:
+                    self.error.emit(message["message"])
+        finally:
+            self.worker.join(timeout=5)
+
+
+class Job:
+    """队列中的一个文件处理任务"""
+
+    def __init__(self, file_path, report_only=False, annotation_mode="inline", partial_interval=None):
+        self.file_path = Path(file_path)
+        self.report_only = report_only
+        self.annotation_mode = annotation_mode
+        self.partial_interval = partial_interval
+        self.status = STATUS_PENDING
+        self.progress = 0
+        self.message = ""
+        self.output_path = None
+        self.tokens = 0
+        self.thread = None
+
+
+class JobTableModel(QAbstractTableModel):
+    """任务列表模型，每个任务一行"""
+
+    HEADERS = ["文件", "状态", "进度", "信息"]
+    PROGRESS_COLUMN = 2
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.jobs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        job = self.jobs[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return job.file_path.name
+            if column == 1:
+                return job.status
+            if column == 2:
+                return f"{job.progress}%"
+            if column == 3:
+                return job.message
+        elif role == Qt.UserRole and column == self.PROGRESS_COLUMN:
+            return job.progress
+        elif role == Qt.ToolTipRole:
+            return str(job.output_path or job.file_path)
+        return None
+
+    def add_jobs(self, jobs):
+        if not jobs:
+            return
+        first = len(self.jobs)
+        self.beginInsertRows(QModelIndex(), first, first + len(jobs) - 1)
+        self.jobs.extend(jobs)
+        self.endInsertRows()
+
+    def job_changed(self, job):
+        row = self.jobs.index(job)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+
+class ProgressDelegate(QStyledItemDelegate):
+    """在任务列表的进度列中绘制进度条"""
+
+    def paint(self, painter, option, index):
+        progress = index.data(Qt.UserRole)
+        if progress is None:
+            super().paint(painter, option, index)
+            return
+        bar = QStyleOptionProgressBar()
+        bar.rect = option.rect.adjusted(2, 2, -2, -2)
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = progress
+        bar.text = f"{progress}%"
+        bar.textVisible = True
+        QApplication.style().drawControl(QStyle.CE_ProgressBar, bar, painter)
+
+
+class SuggestionTableModel(QAbstractTableModel):
+    """检查结果模型
+
+    视图只渲染可见行，结果先缓存再定时批量插入，数千条建议也不会阻塞界面。
+    """
+
+    HEADERS = ["文件", "位置", "原文", "建议", "状态"]
+
+    def __init__(self, parent=None, flush_interval=200):
+        super().__init__(parent)
+        self.rows = []
+        self._pending = []
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setInterval(flush_interval)
+        self._flush_timer.timeout.connect(self.flush)
+        self._flush_timer.start()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.rows[index.row()][index.column()]
+        return None
+
+    def add_row(self, file_name, location, original, suggestion, status):
+        self._pending.append((file_name, location, original, suggestion,
+                              RESULT_STATUS_TEXT.get(status, status)))
+
+    @pyqtSlot()
+    def flush(self):
+        """把缓存的结果批量插入模型"""
+        if not self._pending:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(self._pending) - 1)
+        self.rows.extend(self._pending)
+        self._pending = []
+        self.endInsertRows()
+
+
+class JobQueue(QObject):
+    """多文件处理队列，最多同时运行 max_workers 个任务"""
+
+    counts_changed = pyqtSignal()
+
+    def __init__(self, jobs_model, results_model, max_workers=2, parent=None):
+        super().__init__(parent)
+        self.jobs_model = jobs_model
+        self.results_model = results_model
+        self.max_workers = max_workers
+
+    def add_files(self, paths, report_only=False, annotation_mode="inline", partial_interval=None):
+        """添加文件（或文件夹中的文件）到队列，返回添加的任务数"""
+        jobs = [Job(path, report_only, annotation_mode, partial_interval)
+                for path in collect_office_files(paths)]
+        self.jobs_model.add_jobs(jobs)
+        self._schedule()
+        return len(jobs)
+
+    def set_max_workers(self, max_workers):
+        self.max_workers = max_workers
+        self._schedule()
+
+    def running_count(self):
+        return sum(1 for job in self.jobs_model.jobs if job.thread is not None)
+
+    def counts(self):
+        """各状态的任务数"""
+        result = {}
+        for job in self.jobs_model.jobs:
+            result[job.status] = result.get(job.status, 0) + 1
+        return result
+
+    def cancel(self, job):
+        if job.status == STATUS_PENDING:
+            self._update(job, STATUS_CANCELLED)
+        elif job.status == STATUS_RUNNING:
+            job.thread.cancel()
+            self._update(job, STATUS_CANCELLING)
+
+    def retry(self, job):
+        if job.status in (STATUS_ERROR, STATUS_CANCELLED, STATUS_DONE) and job.thread is None:
+            job.progress = 0
+            job.output_path = None
+            self._update(job, STATUS_PENDING, "")
+            self._schedule()
+
+    def shutdown(self):
+        """结束所有正在运行的任务（退出程序时调用）"""
+        for job in self.jobs_model.jobs:
+            if job.thread is not None:
+                job.thread.kill()
+                job.thread.wait()
+
+    def _update(self, job, status=None, message=None):
+        if status is not None:
+            job.status = status
+        if message is not None:
+            job.message = message
+        self.jobs_model.job_changed(job)
+        self.counts_changed.emit()
+
+    def _schedule(self):
+        for job in self.jobs_model.jobs:
+            if self.running_count() >= self.max_workers:
+                break
+            if job.status == STATUS_PENDING:
+                self._start(job)
+
+    def _start(self, job):
+        thread = ProcessThread(job.file_path, job.report_only, job.annotation_mode, job.partial_interval)
+        job.thread = thread
+        file_name = job.file_path.name
+
+        thread.progress.connect(lambda percent, message: self._on_progress(job, percent, message))
+        thread.result.connect(
+            lambda location, original, suggestion, status:
+            self.results_model.add_row(file_name, location, original, suggestion, status)
+        )
+        thread.finished.connect(
+            lambda output_path, tokens: self._on_finished(job, STATUS_DONE, output_path, tokens)
+        )
+        thread.error.connect(lambda message: self._on_finished(job, STATUS_ERROR, message))
+        thread.cancelled.connect(lambda: self._on_finished(job, STATUS_CANCELLED, ""))
+        self._update(job, STATUS_RUNNING, "")
+        thread.start()
+
+    def _on_progress(self, job, percent, message):
+        job.progress = percent
+        if job.status == STATUS_RUNNING:
+            job.message = message
+        self.jobs_model.job_changed(job)
+
+    def _on_finished(self, job, status, message, tokens=0):
+        thread = job.thread
+        job.thread = None
+        thread.wait()
+        if status == STATUS_DONE:
+            job.output_path = Path(message)
+            job.progress = 100
+            job.tokens = tokens
+            message = f"已保存至: {message}（使用 {tokens} tokens）"
+        self._update(job, status, message)
+        self._schedule()
@@ -1,59 +1,47 @@
+import multiprocessing
 import os
 import sys
 import threading
 from pathlib import Path
 
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QLineEdit, QFileDialog, QMessageBox, QProgressBar,
-                             QWidget, QFrame)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, pyqtSlot
+                             QPushButton, QFileDialog, QMessageBox, QWidget, QFrame, QCheckBox,
+                             QComboBox, QSpinBox, QTableView, QHeaderView, QAbstractItemView,
+                             QSplitter)
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
 from PyQt5.QtGui import QFont
 
-# 导入环境变量加载模块
-from env_loader import load_env_variables
+# 环境变量在工作进程开始处理时才加载（见 env_loader.get_config），不影响界面启动
+from job_queue import (JobQueue, JobTableModel, SuggestionTableModel, ProgressDelegate,
+                       STATUS_PENDING, STATUS_RUNNING, STATUS_CANCELLING, STATUS_DONE,
+                       STATUS_ERROR, STATUS_CANCELLED)
 
-# 加载环境变量
-load_env_variables()
-
-from office_processor import process_document
-
-
-class ProcessThread(QThread):
-    finished = pyqtSignal(str)
-    error = pyqtSignal(str)
-    progress = pyqtSignal(int, str)  # 进度百分比和当前处理的内容
-    
-    def __init__(self, file_path):
-        super().__init__()
-        self.file_path = file_path
-    
-    def progress_callback(self, percent, message):
-        self.progress.emit(percent, message)
-    
-    def run(self):
-        try:
-            output_path = process_document(self.file_path, self.progress_callback)
-            self.finished.emit(str(output_path))
-        except Exception as e:
-            self.error.emit(str(e))
+# 保存部分结果时的最长间隔（秒）
+PARTIAL_SAVE_INTERVAL = 60
 
 
 class OfficeEditorApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Office文档错别字检查工具")
-        self.setGeometry(100, 100, 600, 400)
-        self.setMinimumSize(500, 350)
-        
+        self.setGeometry(100, 100, 900, 650)
+        self.setMinimumSize(700, 500)
+        self.setAcceptDrops(True)
+
+        self.jobs_model = JobTableModel(self)
+        self.results_model = SuggestionTableModel(self)
+        self.job_queue = JobQueue(self.jobs_model, self.results_model, max_workers=2, parent=self)
+        self.job_queue.counts_changed.connect(self.update_status)
+
         self.setup_ui()
-    
+
     def setup_ui(self):
         # 创建中央部件和主布局
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
         main_layout.setContentsMargins(20, 20, 20, 20)
-        
+
         # 标题
         title_label = QLabel("Office文档错别字检查工具")
         title_font = QFont("Arial", 16)
@@ -61,129 +49,198 @@ class OfficeEditorApp(QMainWindow):
         title_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(title_label)
         main_layout.addSpacing(10)
-        
+
         # 说明文本
-        description = "上传PPT或Word文件，使用OpenAI检查错别字和病句。\n处理完成后将在相同位置生成带'修订'后缀的文件。"
+        description = "添加或拖入PPT、Word、Excel文件（或文件夹），使用OpenAI检查错别字和病句。\n处理完成后将在相同位置生成带'修订'后缀的文件。"
         desc_label = QLabel(description)
         desc_label.setWordWrap(True)
         desc_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(desc_label)
-        main_layout.addSpacing(20)
-        
+        main_layout.addSpacing(10)
+
         # 提示信息
         api_info_label = QLabel("OpenAI API密钥已从.env文件读取")
         api_info_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(api_info_label)
         main_layout.addSpacing(10)
-        
-        # 文件选择框架
+
+        # 文件添加框架
         file_frame = QFrame()
         file_layout = QHBoxLayout(file_frame)
         file_layout.setContentsMargins(0, 0, 0, 0)
-        
-        file_label = QLabel("选择文件:")
-        file_layout.addWidget(file_label)
-        
-        self.file_path_edit = QLineEdit()
-        self.file_path_edit.setPlaceholderText("选择Office文件...")
-        file_layout.addWidget(self.file_path_edit)
-        
-        browse_button = QPushButton("浏览")
-        browse_button.clicked.connect(self.browse_file)
-        file_layout.addWidget(browse_button)
-        
+
+        add_files_button = QPushButton("添加文件")
+        add_files_button.clicked.connect(self.browse_files)
+        file_layout.addWidget(add_files_button)
+
+        add_folder_button = QPushButton("添加文件夹")
+        add_folder_button.clicked.connect(self.browse_folder)
+        file_layout.addWidget(add_folder_button)
+
+        file_layout.addStretch(1)
+        file_layout.addWidget(QLabel("并发数:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 16)
+        self.workers_spin.setValue(self.job_queue.max_workers)
+        self.workers_spin.valueChanged.connect(self.job_queue.set_max_workers)
+        file_layout.addWidget(self.workers_spin)
+
         main_layout.addWidget(file_frame)
-        main_layout.addSpacing(20)
-        
-        # 处理按钮
-        self.process_button = QPushButton("开始处理")
-        self.process_button.clicked.connect(self.process_file)
-        self.process_button.setMinimumHeight(40)
-        main_layout.addWidget(self.process_button)
-        main_layout.addSpacing(20)
-        
-        # 进度条
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setTextVisible(True)  # 显示进度文本
-        self.progress_bar.setRange(0, 100)  # 设置为确定模式，范围0-100
-        self.progress_bar.hide()
-        main_layout.addWidget(self.progress_bar)
-        
+        main_layout.addSpacing(10)
+
+        # 仅生成检查报告，不修改文档
+        self.report_only_checkbox = QCheckBox("仅生成检查报告（不生成修订文件）")
+        main_layout.addWidget(self.report_only_checkbox)
+
+        # 处理大文件时提前保存已完成的部分
+        self.partial_checkbox = QCheckBox("处理过程中保存已完成的部分（每完成一节或10张幻灯片，或每分钟）")
+        main_layout.addWidget(self.partial_checkbox)
+
+        # 标注方式
+        mode_frame = QFrame()
+        mode_layout = QHBoxLayout(mode_frame)
+        mode_layout.setContentsMargins(0, 0, 0, 0)
+        mode_layout.addWidget(QLabel("标注方式:"))
+        self.annotation_mode_combo = QComboBox()
+        self.annotation_mode_combo.addItem("在原文后添加红色建议", "inline")
+        self.annotation_mode_combo.addItem("Word批注（仅.docx，不改动正文）", "comments")
+        self.annotation_mode_combo.addItem("Word修订（仅.docx，可在Word中接受/拒绝）", "revisions")
+        mode_layout.addWidget(self.annotation_mode_combo, 1)
+        main_layout.addWidget(mode_frame)
+        main_layout.addSpacing(10)
+
+        # 任务列表和检查结果
+        splitter = QSplitter(Qt.Vertical)
+
+        self.jobs_view = QTableView()
+        self.jobs_view.setModel(self.jobs_model)
+        self.jobs_view.setItemDelegateForColumn(JobTableModel.PROGRESS_COLUMN, ProgressDelegate(self))
+        self.jobs_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.jobs_view.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.jobs_view.verticalHeader().setVisible(False)
+        splitter.addWidget(self.jobs_view)
+
+        self.results_view = QTableView()
+        self.results_view.setModel(self.results_model)
+        # 固定行高，视图无需逐行计算尺寸
+        self.results_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.results_view.verticalHeader().setDefaultSectionSize(22)
+        self.results_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.results_view.horizontalHeader().setStretchLastSection(True)
+        self.results_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        splitter.addWidget(self.results_view)
+        main_layout.addWidget(splitter, 1)
+
+        # 任务操作按钮
+        action_frame = QFrame()
+        action_layout = QHBoxLayout(action_frame)
+        action_layout.setContentsMargins(0, 0, 0, 0)
+
+        cancel_button = QPushButton("取消选中任务")
+        cancel_button.clicked.connect(self.cancel_selected)
+        action_layout.addWidget(cancel_button)
+
+        retry_button = QPushButton("重试选中任务")
+        retry_button.clicked.connect(self.retry_selected)
+        action_layout.addWidget(retry_button)
+
+        action_layout.addStretch(1)
+        main_layout.addWidget(action_frame)
+
         # 状态标签
         self.status_label = QLabel("准备就绪")
         self.status_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(self.status_label)
-        
+
         # 底部信息
-        main_layout.addStretch(1)
-        footer_label = QLabel("支持 .docx, .pptx 格式文件")
+        footer_label = QLabel("支持 .docx, .pptx, .xlsx 格式文件")
         footer_font = QFont("Arial", 8)
         footer_label.setFont(footer_font)
         footer_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(footer_label)
-    
-    def browse_file(self):
-        file_filter = "Office文件 (*.docx *.pptx);;Word文档 (*.docx);;PowerPoint演示文稿 (*.pptx);;所有文件 (*.*)"
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择文件", "", file_filter)
-        if file_path:
-            self.file_path_edit.setText(file_path)
-    
-    def process_file(self):
-        # 获取文件路径
-        file_path = self.file_path_edit.text()
-        if not file_path:
-            QMessageBox.critical(self, "错误", "请先选择一个文件")
-            return
-        
-        file_path = Path(file_path)
-        if not file_path.exists():
-            QMessageBox.critical(self, "错误", "文件不存在")
-            return
-        
-        if file_path.suffix.lower() not in [".docx", ".pptx"]:
-            QMessageBox.critical(self, "错误", "不支持的文件格式，请选择.docx或.pptx文件")
-            return
-        
-        # 禁用按钮并显示进度条
-        self.process_button.setEnabled(False)
-        self.progress_bar.show()
-        self.status_label.setText("正在处理文件...")
-        
-        # 在新线程中处理文件
-        self.process_thread = ProcessThread(file_path)
-        self.process_thread.finished.connect(self.processing_complete)
-        self.process_thread.error.connect(self.processing_error)
-        self.process_thread.progress.connect(self.update_progress)
-        self.process_thread.start()
-    
-    @pyqtSlot(str)
-    def processing_complete(self, output_path):
-        self.progress_bar.hide()
-        self.process_button.setEnabled(True)
-        self.status_label.setText("处理完成")
-        
-        QMessageBox.information(self, "完成", f"文件处理完成！\n\n已保存至: {output_path}")
-    
-    @pyqtSlot(int, str)
-    def update_progress(self, percent, message):
-        self.progress_bar.setValue(percent)
-        self.status_label.setText(message)
-    
-    @pyqtSlot(str)
-    def processing_error(self, error_message):
-        self.progress_bar.hide()
-        self.process_button.setEnabled(True)
-        self.status_label.setText("处理出错")
-        
-        QMessageBox.critical(self, "错误", f"处理文件时出错:\n{error_message}")
+
+    def browse_files(self):
+        file_filter = "Office文件 (*.docx *.pptx *.xlsx);;Word文档 (*.docx);;PowerPoint演示文稿 (*.pptx);;Excel工作簿 (*.xlsx);;所有文件 (*.*)"
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "选择文件", "", file_filter)
+        if file_paths:
+            self.add_paths(file_paths)
+
+    def browse_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择文件夹")
+        if folder:
+            self.add_paths([folder])
+
+    def add_paths(self, paths):
+        """把文件或文件夹加入处理队列"""
+        added = self.job_queue.add_files(
+            paths,
+            report_only=self.report_only_checkbox.isChecked(),
+            annotation_mode=self.annotation_mode_combo.currentData(),
+            partial_interval=PARTIAL_SAVE_INTERVAL if self.partial_checkbox.isChecked() else None,
+        )
+        if not added:
+            QMessageBox.critical(self, "错误", "未找到支持的文件，请选择.docx、.pptx或.xlsx文件")
+
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        paths = [url.toLocalFile() for url in event.mimeData().urls() if url.isLocalFile()]
+        if paths:
+            self.add_paths(paths)
+            event.acceptProposedAction()
+
+    def selected_jobs(self):
+        rows = sorted({index.row() for index in self.jobs_view.selectionModel().selectedRows()})
+        return [self.jobs_model.jobs[row] for row in rows]
+
+    def cancel_selected(self):
+        for job in self.selected_jobs():
+            self.job_queue.cancel(job)
+
+    def retry_selected(self):
+        for job in self.selected_jobs():
+            self.job_queue.retry(job)
+
+    def closeEvent(self, event):
+        # 工作进程不是守护进程，退出前需要结束仍在运行的任务
+        self.job_queue.shutdown()
+        super().closeEvent(event)
+
+    @pyqtSlot()
+    def update_status(self):
+        counts = self.job_queue.counts()
+        active = counts.get(STATUS_RUNNING, 0) + counts.get(STATUS_CANCELLING, 0)
+        self.status_label.setText(
+            f"处理中 {active}，等待 {counts.get(STATUS_PENDING, 0)}，"
+            f"完成 {counts.get(STATUS_DONE, 0)}，出错 {counts.get(STATUS_ERROR, 0)}，"
+            f"取消 {counts.get(STATUS_CANCELLED, 0)}"
+        )
 
 
 def main():
+    # 打包后的程序需要在启动工作进程前调用
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = OfficeEditorApp()
     window.show()
+    if "--startup-benchmark" in sys.argv:
+        # 供 benchmark_startup.py 使用：窗口显示后立即报告并退出
+        QTimer.singleShot(0, lambda: report_startup(app))
     sys.exit(app.exec_())
 
 
+# 启动时不应加载的重型模块
+HEAVY_MODULES = ("openai", "docx", "pptx", "openpyxl", "lxml")
+
+
+def report_startup(app):
+    """输出窗口已显示的标记和启动时已加载的重型模块，然后退出"""
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"STARTUP_BENCHMARK window_shown heavy_modules={','.join(loaded)}", flush=True)
+    app.quit()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
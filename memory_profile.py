@@ -0,0 +1,104 @@
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def peak_rss_bytes(children=False):
+    """进程的峰值常驻内存（字节），当前平台无法获取时返回 None
+
+    children 为 True 时返回已结束的子进程（例如进程池中的进程）中最大的峰值常驻内存。
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows 没有 resource 模块
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以KB为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# tracemalloc 对整个进程生效，同一时间只允许一个任务记录内存使用（服务模式下多个任务在不同线程中运行）
+_profiling_lock = threading.Lock()
+
+
+class MemoryProfiler:
+    """按处理阶段记录内存使用
+
+    每个阶段记录 tracemalloc 统计的Python内存分配（阶段开始、结束和峰值）、进程的峰值RSS，
+    以及该阶段中新增内存最多的几个分配位置。enabled 为 False 时 stage 不做任何事情。
+    开启后 tracemalloc 会明显拖慢处理速度，只应在排查内存问题时使用。
+    同一进程中已有其他任务在记录时，本任务不记录内存使用。
+    """
+
+    def __init__(self, enabled=False, top_sites=5):
+        self.enabled = enabled
+        self.top_sites = top_sites
+        self.stages = []
+        self._started_tracing = False
+        self._holds_lock = False
+
+    def start(self):
+        if not self.enabled or self._holds_lock:
+            return
+        if not _profiling_lock.acquire(blocking=False):
+            print("已有其他任务正在记录内存使用，本任务不记录")
+            self.enabled = False
+            return
+        self._holds_lock = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if self._holds_lock:
+            self._holds_lock = False
+            _profiling_lock.release()
+
+    def _snapshot(self):
+        # 排除 tracemalloc 自身的分配
+        return tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        self.start()
+        if not self.enabled:
+            yield
+            return
+        before = self._snapshot()
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            seconds = time.perf_counter() - start_time
+            top_allocations = [
+                {
+                    "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in self._snapshot().compare_to(before, "lineno")[:self.top_sites]
+            ]
+            self.stages.append({
+                "stage": name,
+                "seconds": round(seconds, 3),
+                "traced_start_bytes": start_bytes,
+                "traced_end_bytes": end_bytes,
+                "traced_peak_bytes": peak_bytes,
+                "peak_rss_bytes": peak_rss_bytes(),
+                "top_allocations": top_allocations,
+            })
@@ -1,22 +1,74 @@
 import os
 import re
 import tempfile
+import threading
+import time
 from pathlib import Path
 
-from openai import OpenAI
-from docx import Document
-from pptx import Presentation
-from docx.shared import RGBColor
-from pptx.dml.color import RGBColor as PPTRGBColor
+# openai、python-docx、python-pptx、openpyxl 等较重的库在开始处理时才导入，
+# 导入本模块不会拖慢程序启动
 
 # 导入自定义环境变量加载模块
-from env_loader import load_env_variables, get_api_key, get_api_base_url
+from env_loader import (get_api_key, get_api_base_url, get_hedge_settings, get_breaker_settings,
+                        get_request_settings, get_rewrite_workers, get_slide_workers, get_token_budget,
+                        get_memory_profile, get_glossary_path)
+from hedging import HedgePolicy
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from report import ProcessingReport, ReportWriter
+from progress import ProgressReporter
+from memory_profile import MemoryProfiler
+from prompt_builder import PROMPT_CACHE_MIN_TOKENS, Glossary, PromptBuilder
+from token_accounting import TokenLedger, process_usage
+from snapshots import PartialSaver, atomic_save
+from suggestion_matcher import match_suggestions
 
-# 加载.env文件中的环境变量
-load_env_variables()
+# 标注方式：在原文后添加红色建议，或添加Word原生批注/修订（仅.docx）
+ANNOTATION_INLINE = "inline"
+ANNOTATION_COMMENTS = "comments"
+ANNOTATION_REVISIONS = "revisions"
+ANNOTATION_MODES = (ANNOTATION_INLINE, ANNOTATION_COMMENTS, ANNOTATION_REVISIONS)
+
+# 保存部分结果时，每完成多少张幻灯片保存一次
+PARTIAL_SLIDE_RANGE = 10
+
+# 行内重建段落的耗时（秒），用于判断进程池是否划算以及使用几个进程。
+# 测量条件：每段4个格式交替的文本运行、3处建议，spawn 启动方式，CPython 3 / Linux
+REWRITE_INLINE_SECONDS = 0.00066         # 在本进程中重建一个段落
+REWRITE_XML_SECONDS = 0.00116            # 在工作进程中解析、重建并序列化一个段落
+REWRITE_TRANSFER_SECONDS = 0.00015       # 主进程序列化段落、解析重建结果并替换回文档
+REWRITE_WORKER_STARTUP_SECONDS = 0.25    # 启动一个工作进程（重新导入 lxml、python-docx 等模块）
+
+# 使用的模型
+MODEL_NAME = "gpt-4o-mini"
 
 # 全局变量
 client = None
+# 校对请求的构造器（系统提示词和术语表），第一次检查文本时创建
+prompt_builder = None
+_prompt_builder_lock = threading.Lock()
+# 对冲请求策略（默认不启用）及对冲请求使用的客户端
+hedge_policy = None
+hedge_client = None
+# API熔断器：连续失败后快速跳过剩余段落，而不是逐段等待超时
+breaker = CircuitBreaker(**get_breaker_settings())
+
+
+class SuggestionUnavailableError(Exception):
+    """API不可用，文本未能完成检查"""
+
+
+# 超出token预算时未检查文本单元的原因
+TOKEN_BUDGET_REASON = "已达到token预算上限，未发送检查请求"
+
+
+class ProcessingCancelled(Exception):
+    """处理被用户取消"""
+
+
+def check_cancelled(cancel_event):
+    """cancel_event 被设置时抛出 ProcessingCancelled"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise ProcessingCancelled("处理已取消")
 
 def init_openai_client():
     """初始化OpenAI客户端"""
@@ -34,22 +86,110 @@ def init_openai_client():
         raise ValueError("请在.env文件中设置有效的OPENAI_API_KEY环境变量")
     
     try:
+        from openai import OpenAI
+        
         # 从环境变量获取API基础URL
         api_base_url = get_api_base_url()
         
-        # 使用指定的API基础URL初始化客户端
+        # 使用指定的API基础URL初始化客户端；显式设置超时和重试次数，
+        # 端点无响应时熔断器能在可预期的时间内打开，而不是按openai默认值每次等待10分钟并重试两次
         client = OpenAI(
             api_key=api_key,  # 确保API密钥是ASCII字符
-            base_url=api_base_url
+            base_url=api_base_url,
+            **get_request_settings()
         )
+
+        # 如果.env中配置了对冲百分位，则启用对冲请求
+        hedge_settings = get_hedge_settings()
+        if hedge_settings and hedge_policy is None:
+            configure_hedging(**hedge_settings)
+
         return client
     except Exception as e:
         print(f"OpenAI客户端初始化错误: {e}")
         raise
 
 
-def process_document(file_path, progress_callback=None):
-    """处理Office文档，检查错别字和病句"""
+def get_prompt_builder():
+    """返回校对请求的构造器，第一次调用时加载术语表"""
+    global prompt_builder
+    # 并行检查幻灯片或服务模式下多个任务可能同时第一次调用
+    with _prompt_builder_lock:
+        if prompt_builder is not None:
+            return prompt_builder
+        
+        glossary = Glossary()
+        glossary_path = get_glossary_path()
+        if glossary_path:
+            try:
+                glossary = Glossary.load(glossary_path)
+                print(f"加载了术语表: {glossary_path}（{len(glossary)} 个条目）")
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"读取术语表出错: {e}")
+        prompt_builder = PromptBuilder(glossary)
+        prefix_tokens = prompt_builder.prefix_tokens(MODEL_NAME)
+        if prefix_tokens < PROMPT_CACHE_MIN_TOKENS:
+            print(f"警告: 系统提示词约 {prefix_tokens} 个token，不足 {PROMPT_CACHE_MIN_TOKENS}，无法命中提示词缓存")
+        return prompt_builder
+
+
+def configure_hedging(percentile=95, max_hedge_ratio=0.1, base_url=None, max_workers=32):
+    """启用对冲请求：请求超过延迟百分位仍未完成时发送重复请求，先返回者胜出
+
+    base_url 不为空时，对冲请求发往该端点；否则发往主端点。
+    max_workers 为同时在途的请求数上限，应不小于并行检查的线程数（幻灯片线程数 × 同时处理的任务数）。
+    """
+    global hedge_policy, hedge_client
+    from openai import OpenAI
+
+    hedge_policy = HedgePolicy(percentile=percentile, max_hedge_ratio=max_hedge_ratio,
+                               max_workers=max_workers)
+    if base_url:
+        hedge_client = OpenAI(api_key=get_api_key(), base_url=base_url, **get_request_settings())
+    else:
+        hedge_client = None
+    return hedge_policy
+
+
+def get_hedge_stats():
+    """获取对冲请求统计（已发送/胜出的对冲次数），未启用对冲时返回None"""
+    if hedge_policy is None:
+        return None
+    return hedge_policy.stats()
+
+
+def new_token_ledger(budget=None):
+    """创建一个文档（任务）的token账本
+
+    budget 只能收紧配置中的预算（OPENAI_TOKEN_BUDGET）：配置了预算时取两者中较小的一个，
+    未指定或不是正数时使用配置中的预算。
+    """
+    configured = get_token_budget()
+    if not budget or budget <= 0:
+        return TokenLedger(configured)
+    return TokenLedger(min(budget, configured) if configured else budget)
+
+
+def process_document(file_path, progress_callback=None, report_only=False, report_format="jsonl",
+                     annotation_mode=ANNOTATION_INLINE, cancel_event=None, row_callback=None,
+                     partial_interval=None, token_ledger=None, memory_profile=None):
+    """处理Office文档，检查错别字和病句
+
+    report_only 为 True 时只读打开文档并输出检查报告（jsonl 或 csv），不生成修订文件。
+    annotation_mode 指定修订文件中建议的标注方式，见 ANNOTATION_MODES。
+    cancel_event（threading.Event 或同类对象）被设置后，处理会在下一个文本单元前
+    抛出 ProcessingCancelled 停止。
+    row_callback(location, original, suggestion, status) 在每条检查结果产生时被调用。
+    partial_interval（秒）不为 None 时，处理Word和PowerPoint文件的过程中会把已完成的部分
+    保存为修订文件：每完成一节或一组幻灯片保存一次，且至少每隔 partial_interval 秒保存一次。
+    token_ledger（TokenLedger）记录本文档的token用量并执行预算，未指定时按配置新建；
+    达到预算后不再发送请求，剩余文本单元记录为未检查。
+    memory_profile 为 True 时记录Word和PowerPoint处理各阶段的内存使用并写入报告，
+    未指定时按配置（OFFICE_MEMORY_PROFILE）决定。
+    """
+    if annotation_mode not in ANNOTATION_MODES:
+        raise ValueError(f"不支持的标注方式: {annotation_mode}")
+    
     # 初始化OpenAI客户端
     try:
         init_openai_client()
@@ -61,20 +201,80 @@ def process_document(file_path, progress_callback=None):
     
     file_path = Path(file_path)
     file_extension = file_path.suffix.lower()
+    if token_ledger is None:
+        token_ledger = new_token_ledger()
+    if memory_profile is None:
+        memory_profile = get_memory_profile()
+    
+    if report_only:
+        return report_document(file_path, progress_callback, report_format, cancel_event, row_callback,
+                               token_ledger)
     
     # 根据文件类型选择处理函数
     if file_extension == ".docx":
-        return process_word(file_path, progress_callback)
+        return process_word(file_path, progress_callback, annotation_mode, cancel_event, row_callback,
+                            partial_interval, token_ledger, memory_profile)
     elif file_extension == ".pptx":
-        return process_powerpoint(file_path, progress_callback)
+        if annotation_mode != ANNOTATION_INLINE:
+            print("PowerPoint演示文稿仅支持在原文后添加建议，已忽略标注方式设置")
+        return process_powerpoint(file_path, progress_callback, cancel_event, row_callback, partial_interval,
+                                  token_ledger, memory_profile=memory_profile)
+    elif file_extension == ".xlsx":
+        if partial_interval is not None:
+            print("Excel工作簿在读取完成后一次写出，不支持保存部分结果")
+        return process_excel(file_path, progress_callback, cancel_event, row_callback, token_ledger)
     else:
         raise ValueError(f"不支持的文件格式: {file_extension}")
 
 
-def get_openai_suggestions(text):
-    """使用OpenAI检查文本中的错别字和病句"""
+def build_messages(text):
+    """构造一次校对请求的消息列表：系统提示词保持不变，只有用户消息随文本变化"""
+    return get_prompt_builder().build_messages(text)
+
+
+def request_suggestions(api_client, text):
+    """向指定的客户端发送一次校对请求，返回解析出的建议和本次请求的token用量（usage）"""
+    response = api_client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=build_messages(text),
+        temperature=0.3,
+        max_tokens=2000
+    )
+    # 所有响应都计入进程累计用量，包括最终未被采用的对冲请求
+    process_usage.record(response.usage)
+    
+    suggestions_text = response.choices[0].message.content.strip()
+    
+    # 解析建议
+    suggestions = []
+    for line in suggestions_text.split("\n"):
+        if "|" in line:
+            parts = line.split("|")
+            if len(parts) >= 2:
+                original = parts[0].strip()
+                if original.startswith("["): 
+                    original = original[1:]
+                if original.endswith("]"): 
+                    original = original[:-1]
+                
+                suggestion = parts[1].strip()
+                if suggestion.startswith("["): 
+                    suggestion = suggestion[1:]
+                if suggestion.endswith("]"): 
+                    suggestion = suggestion[:-1]
+                
+                suggestions.append((original, suggestion))
+    
+    return suggestions, response.usage
+
+
+def get_openai_suggestions(text, on_discarded_usage=None):
+    """使用OpenAI检查文本中的错别字和病句，返回 (文本, 建议, token用量)
+
+    发送了对冲请求时，未被采用的那个请求同样计费，它完成后以其token用量调用 on_discarded_usage。
+    """
     if not text or text.strip() == "":
-        return text, []
+        return text, [], None
     
     # 确保客户端已初始化
     try:
@@ -89,702 +289,636 @@ def get_openai_suggestions(text):
         else:
             text_utf8 = str(text)
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "你是一位专业的校对助手。请检查以下文本中的错别字和语法错误。只需指出需要修改的部分并提供修改后的文本。无需解释原因。如果不需要修改，则返回空字符串。格式：原文|修改后的文本"}, 
-                {"role": "user", "content": text_utf8}
-            ],
-            temperature=0.3,
-            max_tokens=2000
-        )
-        
-        suggestions_text = response.choices[0].message.content.strip()
+        breaker.check()
         
-        # 解析建议
-        suggestions = []
-        for line in suggestions_text.split("\n"):
-            if "|" in line:
-                parts = line.split("|")
-                if len(parts) >= 2:
-                    original = parts[0].strip()
-                    if original.startswith("["): 
-                        original = original[1:]
-                    if original.endswith("]"): 
-                        original = original[:-1]
-                    
-                    suggestion = parts[1].strip()
-                    if suggestion.startswith("["): 
-                        suggestion = suggestion[1:]
-                    if suggestion.endswith("]"): 
-                        suggestion = suggestion[:-1]
-                    
-                    suggestions.append((original, suggestion))
+        if hedge_policy is not None:
+            backup_client = hedge_client or client
+            on_discarded = None
+            if on_discarded_usage is not None:
+                on_discarded = lambda result: on_discarded_usage(result[1])
+            suggestions, usage = hedge_policy.call(
+                lambda: request_suggestions(client, text_utf8),
+                lambda: request_suggestions(backup_client, text_utf8),
+                on_discarded
+            )
+        else:
+            suggestions, usage = request_suggestions(client, text_utf8)
         
-        return text, suggestions
+        breaker.record_success()
+        return text, suggestions, usage
     
+    except CircuitOpenError as e:
+        raise SuggestionUnavailableError(str(e)) from e
     except Exception as e:
         print(f"OpenAI API调用出错: {e}")
-        # 使用模拟数据作为备选
-        print("使用模拟数据作为备选...")
-        suggestions = []
-        if len(text) > 10:
-            sample = text[5:15] if len(text) > 15 else text[:5]
-            suggestions.append((sample, sample + "(建议修改示例)"))
-        return text, suggestions
-
-
-def process_word(file_path, progress_callback=None):
-    """处理Word文档"""
-    doc = Document(file_path)
-    
-    # 计算总项目数（段落 + 表格中的段落）
-    # 包括空段落在内的所有段落都计入总数
-    # 这样即使跳过空段落，进度计算也是准确的
-    total_items = len(doc.paragraphs)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                total_items += len(cell.paragraphs)
-    
-    # 当前已处理项目数
-    processed_items = 0
-    
-    # 处理段落
-    for paragraph in doc.paragraphs:
-        text = paragraph.text
-        # 跳过空段落的处理
-        if not text.strip():
-            # 更新进度
-            processed_items += 1
-            if progress_callback:
-                progress_percent = int((processed_items / total_items) * 100)
-                progress_callback(progress_percent, f"正在处理 {processed_items}/{total_items}")
-            continue
-            
-        _, suggestions = get_openai_suggestions(text)
+        breaker.record_failure()
+        # 不再编造修改建议，由调用方将该文本记录为未检查
+        raise SuggestionUnavailableError(f"OpenAI API调用出错: {e}") from e
+
+
+def check_text(text, location, report, cache=None, progress=None):
+    """检查一个文本单元，API不可用时在报告中将其记录为未检查并返回空列表
+
+    返回按位置排列、互不重叠的 (起始位置, 结束位置, 建议)，写入文档时直接使用这些位置，
+    不再按原文重新查找；无法定位原文的建议和被术语表抑制的建议只记录在报告中，不会返回。
+
+    传入 cache 字典时，相同的文本只调用一次API，之后直接复用检查结果。
+    传入 progress（ProgressReporter）时，记录API调用耗时用于估算剩余时间。
+    """
+    if cache is not None and text in cache:
+        spans, unanchored, glossary_hits = cache[text]
+        report.mark_checked(location, [(text[start:end], suggestion) for start, end, suggestion in spans],
+                            unanchored, glossary_hits)
+        return spans
+    
+    # 发送请求前估算输入和输出token数并预留额度，超出预算时不再发送
+    ledger = report.token_ledger
+    builder = get_prompt_builder()
+    estimated_tokens = builder.estimate_prompt_tokens(text, MODEL_NAME)
+    estimated_completion_tokens = builder.estimate_completion_tokens(text, MODEL_NAME)
+    if not ledger.reserve(estimated_tokens, estimated_completion_tokens):
+        report.mark_unchecked(location, text, TOKEN_BUDGET_REASON)
+        return []
+    
+    start = time.monotonic()
+    try:
+        _, raw_suggestions, usage = get_openai_suggestions(
+            text, lambda discarded_usage: ledger.record_discarded(location, discarded_usage))
+    except SuggestionUnavailableError as e:
+        ledger.release(estimated_tokens, estimated_completion_tokens)
+        report.mark_unchecked(location, text, str(e))
+        return []
+    ledger.record(location, estimated_tokens, usage, estimated_completion_tokens)
+    
+    if progress is not None:
+        progress.observe_latency(time.monotonic() - start)
+    
+    # 按原文在文本中的位置整理建议，在文本中找不到原文的建议单独记录
+    match = match_suggestions(text, raw_suggestions)
+    # 会改动术语表中保留术语的建议不写入文档，只记录在报告中
+    spans, glossary_hits = builder.glossary.split_hits(text, match.spans)
+    
+    if cache is not None:
+        cache[text] = (spans, match.unanchored, glossary_hits)
+    report.mark_checked(location, [(text[start:end], suggestion) for start, end, suggestion in spans],
+                        match.unanchored, glossary_hits)
+    return spans
+
+
+def print_token_usage(report):
+    """输出本文档的token用量"""
+    ledger = report.token_ledger
+    usage = ledger.usage
+    budget_text = f"，预算 {ledger.budget}" if ledger.budget else ""
+    print(f"token用量: 输入 {usage.prompt_tokens}（其中缓存 {usage.cached_tokens}），"
+          f"输出 {usage.completion_tokens}，共 {usage.total_tokens}{budget_text}")
+    if ledger.exhausted:
+        budget_skipped = sum(1 for unit in report.unchecked if unit["reason"] == TOKEN_BUDGET_REASON)
+        print(f"警告: 已达到token预算上限，剩余 {budget_skipped} 个文本单元未检查")
+
+
+def save_report(report, file_path):
+    """输出token用量并保存报告文件（包括逐个文本单元的token用量、未检查的文本单元和内存使用）"""
+    print_token_usage(report)
+    
+    report_path = get_report_path(file_path)
+    report.save(report_path)
+    if report.unchecked:
+        print(f"警告: {len(report.unchecked)} 个文本单元未检查（API不可用或超出token预算），详见 {report_path}")
+    if report.memory_stages:
+        print(f"各阶段内存使用已写入 {report_path}")
+    return report_path
+
+
+def report_document(file_path, progress_callback=None, report_format="jsonl", cancel_event=None,
+                    row_callback=None, token_ledger=None):
+    """仅检查文档并流式写出检查报告，不修改也不保存文档"""
+    from ooxml_reader import iter_word_units, iter_powerpoint_units, iter_excel_units
+    
+    file_path = Path(file_path)
+    file_extension = file_path.suffix.lower()
+    
+    # 读取器按已读取的数据量报告进度，这里只做限频并附加剩余时间估算
+    progress = ProgressReporter(progress_callback)
+    if file_extension == ".docx":
+        units = iter_word_units(file_path, progress.update)
+    elif file_extension == ".pptx":
+        units = iter_powerpoint_units(file_path, progress.update)
+    elif file_extension == ".xlsx":
+        units = iter_excel_units(file_path, progress.update)
+    else:
+        raise ValueError(f"不支持的文件格式: {file_extension}")
+    
+    # 工作簿中大量单元格引用同一个共享字符串，相同文本只检查一次
+    cache = {} if file_extension == ".xlsx" else None
+    
+    output_path = get_check_report_path(file_path, report_format)
+    with ReportWriter(output_path, report_format) as writer:
+        report = ProcessingReport(file_path, writer, row_callback, token_ledger)
+        for location, text in units:
+            check_cancelled(cancel_event)
+            check_text(text, location, report, cache, progress)
+    
+    progress.finish(f"检查完成，共 {report.suggestion_count} 条建议")
+    save_report(report, file_path)
+    
+    return output_path
+
+
+def process_word(file_path, progress_callback=None, annotation_mode=ANNOTATION_INLINE, cancel_event=None,
+                 row_callback=None, partial_interval=None, token_ledger=None, memory_profile=False):
+    """处理Word文档
+
+    memory_profile 为 True 时记录载入、收集段落、检查、重建段落和保存各阶段的内存使用，写入报告。
+    """
+    from docx import Document
+    from word_markup import RevisionWriter
+    
+    profiler = MemoryProfiler(memory_profile)
+    try:
+        with profiler.stage("load"):
+            doc = Document(file_path)
+        report = ProcessingReport(file_path, row_callback=row_callback, token_ledger=token_ledger)
+        report.memory_stages = profiler.stages
+        revision_writer = RevisionWriter(doc) if annotation_mode == ANNOTATION_REVISIONS else None
         
-        if suggestions:
-                # 保存原始段落的所有运行及其格式
-                original_runs = []
-                for run in paragraph.runs:
-                    original_runs.append({
-                        'text': run.text,
-                        'bold': run.bold,
-                        'italic': run.italic,
-                        'underline': run.underline,
-                        'font': run.font.name,
-                        'size': run.font.size,
-                        'color': run.font.color.rgb if run.font.color.rgb else None,
-                        'highlight_color': run.font.highlight_color,
-                        'style': run.style
-                    })
-                
-                # 清除段落中的所有运行
-                p_element = paragraph._element
-                p_element.clear()
-                
-                # 重建原始文本并添加建议
-                # 首先构建原始文本的字符位置到运行的映射
-                char_to_run_map = []
-                current_pos = 0
-                for run_info in original_runs:
-                    run_text = run_info['text']
-                    for _ in range(len(run_text)):
-                        char_to_run_map.append(run_info)
-                        current_pos += 1
-                
-                # 重新添加文本，并在需要修改的地方添加红色建议
-                current_pos = 0
-                for original, suggestion in suggestions:
-                    # 查找原文在文本中的位置
-                    pos = text.find(original, current_pos)
-                    if pos != -1:
-                        # 添加原文前的文本，保持原始格式
-                        if pos > current_pos:
-                            for i in range(current_pos, pos):
-                                if i < len(char_to_run_map):
-                                    run_info = char_to_run_map[i]
-                                    run = paragraph.add_run(text[i])
-                                    # 应用原始格式
-                                    run.bold = run_info['bold']
-                                    run.italic = run_info['italic']
-                                    run.underline = run_info['underline']
-                                    if run_info['font']:
-                                        run.font.name = run_info['font']
-                                    if run_info['size']:
-                                        run.font.size = run_info['size']
-                                    if run_info['color']:
-                                        run.font.color.rgb = run_info['color']
-                                    run.font.highlight_color = run_info['highlight_color']
-                                    if run_info['style']:
-                                        run.style = run_info['style']
-                                else:
-                                    # 如果没有格式信息，则使用默认格式
-                                    paragraph.add_run(text[i])
-                        
-                        # 添加方括号包围原文
-                        # 先添加左方括号
-                        first_char_pos = pos
-                        if first_char_pos < len(char_to_run_map):
-                            base_run_info = char_to_run_map[first_char_pos]
-                            run = paragraph.add_run("[")
-                            # 应用原始格式
-                            run.bold = base_run_info['bold']
-                            run.italic = base_run_info['italic']
-                            run.underline = base_run_info['underline']
-                            if base_run_info['font']:
-                                run.font.name = base_run_info['font']
-                            if base_run_info['size']:
-                                run.font.size = base_run_info['size']
-                            if base_run_info['color']:
-                                run.font.color.rgb = base_run_info['color']
-                            run.font.highlight_color = base_run_info['highlight_color']
-                            if base_run_info['style']:
-                                run.style = base_run_info['style']
-                        else:
-                            # 如果没有格式信息，则使用默认格式
-                            paragraph.add_run("[")
-                        
-                        # 添加原文，保持原始格式
-                        for i in range(pos, pos + len(original)):
-                            if i < len(char_to_run_map):
-                                run_info = char_to_run_map[i]
-                                run = paragraph.add_run(text[i])
-                                # 应用原始格式
-                                run.bold = run_info['bold']
-                                run.italic = run_info['italic']
-                                run.underline = run_info['underline']
-                                if run_info['font']:
-                                    run.font.name = run_info['font']
-                                if run_info['size']:
-                                    run.font.size = run_info['size']
-                                if run_info['color']:
-                                    run.font.color.rgb = run_info['color']
-                                run.font.highlight_color = run_info['highlight_color']
-                                if run_info['style']:
-                                    run.style = run_info['style']
-                            else:
-                                # 如果没有格式信息，则使用默认格式
-                                paragraph.add_run(text[i])
-                        
-                        # 添加右方括号
-                        last_char_pos = pos + len(original) - 1
-                        if last_char_pos < len(char_to_run_map):
-                            base_run_info = char_to_run_map[last_char_pos]
-                            run = paragraph.add_run("]")
-                            # 应用原始格式
-                            run.bold = base_run_info['bold']
-                            run.italic = base_run_info['italic']
-                            run.underline = base_run_info['underline']
-                            if base_run_info['font']:
-                                run.font.name = base_run_info['font']
-                            if base_run_info['size']:
-                                run.font.size = base_run_info['size']
-                            if base_run_info['color']:
-                                run.font.color.rgb = base_run_info['color']
-                            run.font.highlight_color = base_run_info['highlight_color']
-                            if base_run_info['style']:
-                                run.style = base_run_info['style']
-                        else:
-                            # 如果没有格式信息，则使用默认格式
-                            paragraph.add_run("]")
-                        
-                        # 添加红色建议，使用圆括号包围，保持原文格式，仅颜色改为红色
-                        if last_char_pos < len(char_to_run_map):
-                            base_run_info = char_to_run_map[last_char_pos]
-                            run = paragraph.add_run(f"({suggestion})")
-                            # 应用原始格式
-                            run.bold = base_run_info['bold']
-                            run.italic = base_run_info['italic']
-                            run.underline = base_run_info['underline']
-                            if base_run_info['font']:
-                                run.font.name = base_run_info['font']
-                            if base_run_info['size']:
-                                run.font.size = base_run_info['size']
-                            # 仅颜色设置为红色
-                            run.font.color.rgb = RGBColor(255, 0, 0)
-                            run.font.highlight_color = base_run_info['highlight_color']
-                            if base_run_info['style']:
-                                run.style = base_run_info['style']
+        # 按字符数计算进度，空段落不计入
+        with profiler.stage("collect"):
+            paragraphs = list(iter_word_paragraphs(doc))
+            texts = [paragraph.text for _, paragraph in paragraphs]
+        progress = ProgressReporter(progress_callback,
+                                    total_weight=sum(len(text) for text in texts if text.strip()),
+                                    total_units=sum(1 for text in texts if text.strip()))
+        
+        # 行内标注的段落在检查完成后统一重建，段落较多时交给进程池并行处理
+        pending_rewrites = []
+        
+        def flush_rewrites():
+            if pending_rewrites:
+                progress.update(progress.percent(), f"重建 {len(pending_rewrites)} 个段落...")
+                rewrite_word_paragraphs(pending_rewrites, cancel_event=cancel_event)
+                pending_rewrites.clear()
+        
+        output_path = get_output_path(file_path)
+        partial_saver = None
+        if partial_interval is not None:
+            partial_saver = PartialSaver(output_path, doc.save, partial_interval, before_save=flush_rewrites)
+        
+        with profiler.stage("check"):
+            for (location, paragraph), text in zip(paragraphs, texts):
+                # 跳过空段落的处理
+                if text.strip():
+                    check_cancelled(cancel_event)
+                    spans = check_text(text, location, report, progress=progress)
+                    
+                    if spans:
+                        if annotation_mode == ANNOTATION_INLINE:
+                            pending_rewrites.append((paragraph, spans))
                         else:
-                            # 如果没有格式信息，则使用默认格式，仅设置红色
-                            run = paragraph.add_run(f"({suggestion})")
-                            run.font.color.rgb = RGBColor(255, 0, 0)
-                        
-                        current_pos = pos + len(original)
+                            annotate_word_paragraph(doc, paragraph, spans, annotation_mode, revision_writer)
+                    
+                    # 更新进度
+                    progress.advance(len(text), f"处理{location}")
                 
-                # 添加剩余文本，保持原始格式
-                if current_pos < len(text):
-                    for i in range(current_pos, len(text)):
-                        if i < len(char_to_run_map):
-                            run_info = char_to_run_map[i]
-                            run = paragraph.add_run(text[i])
-                            # 应用原始格式
-                            run.bold = run_info['bold']
-                            run.italic = run_info['italic']
-                            run.underline = run_info['underline']
-                            if run_info['font']:
-                                run.font.name = run_info['font']
-                            if run_info['size']:
-                                run.font.size = run_info['size']
-                            if run_info['color']:
-                                run.font.color.rgb = run_info['color']
-                            run.font.highlight_color = run_info['highlight_color']
-                            if run_info['style']:
-                                run.style = run_info['style']
-                        else:
-                            # 如果没有格式信息，则使用默认格式
-                            paragraph.add_run(text[i])
+                if partial_saver is not None:
+                    # 含分节符的段落是一节的最后一个段落
+                    partial_saver.maybe_save(at_boundary=bool(paragraph._p.xpath("./w:pPr/w:sectPr")))
+        
+        with profiler.stage("rewrite"):
+            flush_rewrites()
         
-        # 更新进度
-        processed_items += 1
-        if progress_callback:
-            progress_percent = int((processed_items / total_items) * 100)
-            progress_callback(progress_percent, f"处理段落 {processed_items}/{total_items}")
-    
-    # 处理表格
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    text = paragraph.text
-                    # 跳过空段落的处理
-                    if not text.strip():
-                        # 更新进度
-                        processed_items += 1
-                        if progress_callback:
-                            progress_percent = int((processed_items / total_items) * 100)
-                            progress_callback(progress_percent, f"正在处理 {processed_items}/{total_items}")
+        # 保存修订后的文件
+        progress.finish("保存文件...")
+        with profiler.stage("save"):
+            atomic_save(output_path, doc.save)
+    finally:
+        profiler.stop()
+    save_report(report, file_path)
+    
+    return output_path
+
+
+def iter_word_paragraphs(doc):
+    """按文档顺序返回Word文档中的 (位置, 段落)，表格单元格中的段落出现在表格所在的位置
+
+    文档前面的内容先处理，保存部分结果时审阅者可以从第一页开始查看。
+    """
+    from docx.table import Table
+    
+    paragraph_index = 0
+    table_index = 0
+    for block in doc.iter_inner_content():
+        if isinstance(block, Table):
+            table_index += 1
+            # 合并单元格在 row.cells 中出现多次，每个单元格只处理一次
+            seen_cells = set()
+            for row_index, row in enumerate(block.rows):
+                for cell_index, cell in enumerate(row.cells):
+                    if cell._tc in seen_cells:
                         continue
-                        
-                    _, suggestions = get_openai_suggestions(text)
-                    
-                    if suggestions:
-                            # 保存原始段落的所有运行及其格式
-                            original_runs = []
-                            for run in paragraph.runs:
-                                original_runs.append({
-                                    'text': run.text,
-                                    'bold': run.bold,
-                                    'italic': run.italic,
-                                    'underline': run.underline,
-                                    'font': run.font.name,
-                                    'size': run.font.size,
-                                    'color': run.font.color.rgb if run.font.color.rgb else None,
-                                    'highlight_color': run.font.highlight_color,
-                                    'style': run.style
-                                })
-                            
-                            # 清除段落中的所有运行
-                            p_element = paragraph._element
-                            p_element.clear()
-                            
-                            # 重建原始文本并添加建议
-                            # 首先构建原始文本的字符位置到运行的映射
-                            char_to_run_map = []
-                            current_pos = 0
-                            for run_info in original_runs:
-                                run_text = run_info['text']
-                                for _ in range(len(run_text)):
-                                    char_to_run_map.append(run_info)
-                                    current_pos += 1
-                            
-                            # 重新添加文本，并在需要修改的地方添加红色建议
-                            current_pos = 0
-                            for original, suggestion in suggestions:
-                                # 查找原文在文本中的位置
-                                pos = text.find(original, current_pos)
-                                if pos != -1:
-                                    # 添加原文前的文本，保持原始格式
-                                    if pos > current_pos:
-                                        for i in range(current_pos, pos):
-                                            if i < len(char_to_run_map):
-                                                run_info = char_to_run_map[i]
-                                                run = paragraph.add_run(text[i])
-                                                # 应用原始格式
-                                                run.bold = run_info['bold']
-                                                run.italic = run_info['italic']
-                                                run.underline = run_info['underline']
-                                                if run_info['font']:
-                                                    run.font.name = run_info['font']
-                                                if run_info['size']:
-                                                    run.font.size = run_info['size']
-                                                if run_info['color']:
-                                                    run.font.color.rgb = run_info['color']
-                                                run.font.highlight_color = run_info['highlight_color']
-                                                if run_info['style']:
-                                                    run.style = run_info['style']
-                                            else:
-                                                # 如果没有格式信息，则使用默认格式
-                                                paragraph.add_run(text[i])
-                                    
-                                    # 添加方括号包围原文
-                                    # 先添加左方括号
-                                    first_char_pos = pos
-                                    if first_char_pos < len(char_to_run_map):
-                                        base_run_info = char_to_run_map[first_char_pos]
-                                        run = paragraph.add_run("[")
-                                        # 应用原始格式
-                                        run.bold = base_run_info['bold']
-                                        run.italic = base_run_info['italic']
-                                        run.underline = base_run_info['underline']
-                                        if base_run_info['font']:
-                                            run.font.name = base_run_info['font']
-                                        if base_run_info['size']:
-                                            run.font.size = base_run_info['size']
-                                        if base_run_info['color']:
-                                            run.font.color.rgb = base_run_info['color']
-                                        run.font.highlight_color = base_run_info['highlight_color']
-                                        if base_run_info['style']:
-                                            run.style = base_run_info['style']
-                                    else:
-                                        # 如果没有格式信息，则使用默认格式
-                                        paragraph.add_run("[")
-                                    
-                                    # 添加原文，保持原始格式
-                                    for i in range(pos, pos + len(original)):
-                                        if i < len(char_to_run_map):
-                                            run_info = char_to_run_map[i]
-                                            run = paragraph.add_run(text[i])
-                                            # 应用原始格式
-                                            run.bold = run_info['bold']
-                                            run.italic = run_info['italic']
-                                            run.underline = run_info['underline']
-                                            if run_info['font']:
-                                                run.font.name = run_info['font']
-                                            if run_info['size']:
-                                                run.font.size = run_info['size']
-                                            if run_info['color']:
-                                                run.font.color.rgb = run_info['color']
-                                            run.font.highlight_color = run_info['highlight_color']
-                                            if run_info['style']:
-                                                run.style = run_info['style']
-                                        else:
-                                            # 如果没有格式信息，则使用默认格式
-                                            paragraph.add_run(text[i])
-                                    
-                                    # 添加右方括号
-                                    last_char_pos = pos + len(original) - 1
-                                    if last_char_pos < len(char_to_run_map):
-                                        base_run_info = char_to_run_map[last_char_pos]
-                                        run = paragraph.add_run("]")
-                                        # 应用原始格式
-                                        run.bold = base_run_info['bold']
-                                        run.italic = base_run_info['italic']
-                                        run.underline = base_run_info['underline']
-                                        if base_run_info['font']:
-                                            run.font.name = base_run_info['font']
-                                        if base_run_info['size']:
-                                            run.font.size = base_run_info['size']
-                                        if base_run_info['color']:
-                                            run.font.color.rgb = base_run_info['color']
-                                        run.font.highlight_color = base_run_info['highlight_color']
-                                        if base_run_info['style']:
-                                            run.style = base_run_info['style']
-                                    else:
-                                        # 如果没有格式信息，则使用默认格式
-                                        paragraph.add_run("]")
-                                    
-                                    # 添加红色建议，使用圆括号包围，保持原文格式，仅颜色改为红色
-                                    if last_char_pos < len(char_to_run_map):
-                                        base_run_info = char_to_run_map[last_char_pos]
-                                        run = paragraph.add_run(f"({suggestion})")
-                                        # 应用原始格式
-                                        run.bold = base_run_info['bold']
-                                        run.italic = base_run_info['italic']
-                                        run.underline = base_run_info['underline']
-                                        if base_run_info['font']:
-                                            run.font.name = base_run_info['font']
-                                        if base_run_info['size']:
-                                            run.font.size = base_run_info['size']
-                                        # 仅颜色设置为红色
-                                        run.font.color.rgb = RGBColor(255, 0, 0)
-                                        run.font.highlight_color = base_run_info['highlight_color']
-                                        if base_run_info['style']:
-                                            run.style = base_run_info['style']
-                                    else:
-                                        # 如果没有格式信息，则使用默认格式，仅设置红色
-                                        run = paragraph.add_run(f"({suggestion})")
-                                        run.font.color.rgb = RGBColor(255, 0, 0)
-                                    
-                                    current_pos = pos + len(original)
-                            
-                            # 添加剩余文本，保持原始格式
-                            if current_pos < len(text):
-                                for i in range(current_pos, len(text)):
-                                    if i < len(char_to_run_map):
-                                        run_info = char_to_run_map[i]
-                                        run = paragraph.add_run(text[i])
-                                        # 应用原始格式
-                                        run.bold = run_info['bold']
-                                        run.italic = run_info['italic']
-                                        run.underline = run_info['underline']
-                                        if run_info['font']:
-                                            run.font.name = run_info['font']
-                                        if run_info['size']:
-                                            run.font.size = run_info['size']
-                                        if run_info['color']:
-                                            run.font.color.rgb = run_info['color']
-                                        run.font.highlight_color = run_info['highlight_color']
-                                        if run_info['style']:
-                                            run.style = run_info['style']
-                                    else:
-                                        # 如果没有格式信息，则使用默认格式
-                                        paragraph.add_run(text[i])
-                        
-                    # 更新进度
-                    processed_items += 1
-                    if progress_callback:
-                        progress_percent = int((processed_items / total_items) * 100)
-                        progress_callback(progress_percent, f"处理表格单元格 {processed_items}/{total_items}")
+                    seen_cells.add(cell._tc)
+                    for paragraph in cell.paragraphs:
+                        yield f"表格 {table_index} 第{row_index+1}行第{cell_index+1}列", paragraph
+        else:
+            paragraph_index += 1
+            yield f"段落 {paragraph_index}", block
+
+
+def annotate_word_paragraph(doc, paragraph, spans, annotation_mode, revision_writer=None):
+    """按指定的标注方式把建议写入Word段落，spans 为 check_text 返回的 (起始位置, 结束位置, 建议)"""
+    from word_markup import add_word_comments
     
-    # 保存修订后的文件
-    if progress_callback:
-        progress_callback(100, "保存文件...")
-    output_path = get_output_path(file_path)
-    doc.save(output_path)
+    # 批注和修订模式只拆分建议所在的运行，不重建段落
+    if annotation_mode == ANNOTATION_COMMENTS:
+        add_word_comments(doc, paragraph, spans)
+    elif annotation_mode == ANNOTATION_REVISIONS:
+        revision_writer.apply(paragraph, spans)
+    else:
+        rewrite_word_paragraph_inline(paragraph, spans)
+
+
+def rewrite_word_paragraph_inline(paragraph, spans):
+    """重建Word段落：在需要修改的原文外加方括号，并在其后添加红色建议"""
+    from word_markup import rewrite_inline
     
-    return output_path
+    rewrite_inline(paragraph._p, spans)
 
 
-def process_powerpoint(file_path, progress_callback=None):
-    """处理PowerPoint演示文稿"""
-    prs = Presentation(file_path)
-    
-    # 计算总项目数（所有幻灯片中的非空文本形状）
-    total_items = 0
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                # 包括空文本在内的所有文本形状都计入总数
-                # 这样即使跳过空文本，进度计算也是准确的
-                total_items += 1
-    
-    # 当前已处理项目数
-    processed_items = 0
-    
-    # 处理所有幻灯片
-    for slide_index, slide in enumerate(prs.slides):
-        # 处理形状中的文本
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text = shape.text
-                # 跳过空文本的处理
-                if not text.strip():
-                    # 更新进度
-                    processed_items += 1
-                    if progress_callback:
-                        progress_percent = int((processed_items / total_items) * 100)
-                        progress_callback(progress_percent, f"跳过幻灯片 {slide_index+1} 中空文本 {processed_items}/{total_items}")
-                    continue
-                    
-                _, suggestions = get_openai_suggestions(text)
-                
-                if suggestions:
-                    # 保存原始格式信息
-                    text_frame = shape.text_frame
-                    original_paragraphs = []
-                    
-                    for paragraph in text_frame.paragraphs:
-                        p_info = {
-                            'text': paragraph.text,
-                            'alignment': paragraph.alignment,
-                            'level': paragraph.level,
-                            'runs': []
-                        }
-                        
-                        for run in paragraph.runs:
-                            run_info = {
-                                'text': run.text,
-                                'bold': run.font.bold,
-                                'italic': run.font.italic,
-                                'underline': run.font.underline,
-                                'font': run.font.name,
-                                'size': run.font.size,
-                                'color': run.font.color.rgb if hasattr(run.font.color, 'rgb') else None
-                            }
-                            p_info['runs'].append(run_info)
-                        
-                        original_paragraphs.append(p_info)
-                    
-                    # 构建字符位置到格式的映射
-                    char_to_format_map = []
-                    current_pos = 0
-                    
-                    for p_info in original_paragraphs:
-                        for run_info in p_info['runs']:
-                            run_text = run_info['text']
-                            for _ in range(len(run_text)):
-                                char_to_format_map.append(run_info)
-                                current_pos += 1
-                    
-                    # 清除所有段落
-                    while len(text_frame.paragraphs) > 0:
-                        p = text_frame.paragraphs[0]
-                        p._element.getparent().remove(p._element)
-                    
-                    # 创建新段落
-                    p = text_frame.add_paragraph()
-                    # 应用原始段落格式（使用第一个段落的格式）
-                    if original_paragraphs:
-                        p.alignment = original_paragraphs[0]['alignment']
-                        p.level = original_paragraphs[0]['level']
+def rewrite_process_count(paragraph_count, max_workers):
+    """估算重建 paragraph_count 个段落时最省时的进程数，返回1表示直接在本进程重建
+
+    进程池的耗时按 进程数 × 启动开销 + 段落数 × (主进程传输开销 + 单段重建耗时 / 进程数) 估算，
+    与本进程重建的耗时比较。按测量值，少于3个进程时并行总是更慢，4个进程约4500段以上才划算。
+    """
+    best_workers = 1
+    best_seconds = paragraph_count * REWRITE_INLINE_SECONDS
+    for workers in range(2, max_workers + 1):
+        seconds = (workers * REWRITE_WORKER_STARTUP_SECONDS
+                   + paragraph_count * (REWRITE_TRANSFER_SECONDS + REWRITE_XML_SECONDS / workers))
+        if seconds < best_seconds:
+            best_workers, best_seconds = workers, seconds
+    return best_workers
+
+
+def rewrite_word_paragraphs(pending_rewrites, workers=None, cancel_event=None):
+    """按行内方式重建多个段落，pending_rewrites 为 (段落, 建议位置) 列表
+
+    段落足够多、并行能抵消进程启动和传输的开销时（见 rewrite_process_count），把段落XML和建议
+    发送到进程池重建，再按原顺序把重建后的段落替换回文档；否则直接在本进程重建。
+    workers 为最多使用的进程数。
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    from docx.oxml import parse_xml
+    from lxml import etree
+    from word_markup import rewrite_paragraph_xml
+    
+    workers = rewrite_process_count(len(pending_rewrites), workers or get_rewrite_workers())
+    if workers <= 1:
+        for paragraph, spans in pending_rewrites:
+            check_cancelled(cancel_event)
+            rewrite_word_paragraph_inline(paragraph, spans)
+        return
+    
+    paragraph_xmls = [etree.tostring(paragraph._p) for paragraph, _ in pending_rewrites]
+    span_lists = [spans for _, spans in pending_rewrites]
+    # 每个进程分到几批段落，减少进程间通信的次数
+    chunksize = max(1, len(pending_rewrites) // (workers * 4))
+    
+    # 进程池使用 spawn 启动方式，与工作进程一致
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        results = executor.map(rewrite_paragraph_xml, paragraph_xmls, span_lists, chunksize=chunksize)
+        for (paragraph, _), rewritten_xml in zip(pending_rewrites, results):
+            check_cancelled(cancel_event)
+            old_p = paragraph._p
+            old_p.getparent().replace(old_p, parse_xml(rewritten_xml))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def process_powerpoint(file_path, progress_callback=None, cancel_event=None, row_callback=None,
+                       partial_interval=None, token_ledger=None, slide_workers=None, memory_profile=False):
+    """处理PowerPoint演示文稿
+
+    每张幻灯片是独立的部件，幻灯片按顺序分发给 slide_workers 个线程并行检查（调用API）；
+    检查结果在主线程中按幻灯片顺序写回，XML的修改和保存都只在主线程中进行。
+    memory_profile 为 True 时记录载入、收集形状、检查和保存各阶段的内存使用，写入报告。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from pptx import Presentation
+    
+    profiler = MemoryProfiler(memory_profile)
+    try:
+        with profiler.stage("load"):
+            prs = Presentation(file_path)
+        report = ProcessingReport(file_path, row_callback=row_callback, token_ledger=token_ledger)
+        report.memory_stages = profiler.stages
+        
+        # 按幻灯片收集文本形状，按字符数计算进度，空文本不计入
+        with profiler.stage("collect"):
+            slides = []
+            for slide_index, slide in enumerate(prs.slides):
+                slide_shapes = [(shape, shape.text) for shape in slide.shapes
+                                if hasattr(shape, "text") and shape.text.strip()]
+                slides.append((slide_index, slide_shapes))
+        texts = [text for _, slide_shapes in slides for _, text in slide_shapes]
+        workers = slide_workers or get_slide_workers()
+        progress = ProgressReporter(progress_callback,
+                                    total_weight=sum(len(text) for text in texts),
+                                    total_units=len(texts),
+                                    concurrency=workers)
+        slide_count = len(prs.slides)
+        
+        output_path = get_output_path(file_path)
+        partial_saver = None
+        if partial_interval is not None:
+            partial_saver = PartialSaver(output_path, prs.save, partial_interval)
+        
+        def check_slide(slide_index, slide_shapes):
+            """检查一张幻灯片中的文本形状，返回需要改写的 (形状, 文本, 建议)"""
+            rewrites = []
+            for shape, text in slide_shapes:
+                check_cancelled(cancel_event)
+                location = f"幻灯片 {slide_index+1} 形状 {shape.name}"
+                spans = check_text(text, location, report, progress=progress)
+                if spans:
+                    rewrites.append((shape, text, spans))
+            return rewrites
+        
+        # 检查阶段包括把建议写回幻灯片
+        with profiler.stage("check"):
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="slide")
+            try:
+                futures = [executor.submit(check_slide, slide_index, slide_shapes)
+                           for slide_index, slide_shapes in slides]
+                # 按幻灯片顺序写回结果，前面的幻灯片先完成
+                for (slide_index, slide_shapes), future in zip(slides, futures):
+                    for shape, text, spans in future.result():
+                        rewrite_pptx_shape_inline(shape, text, spans)
                     
-                    # 重新添加文本，并在需要修改的地方添加红色建议
-                    current_pos = 0
-                    for original, suggestion in suggestions:
-                        # 查找原文在文本中的位置
-                        pos = text.find(original, current_pos)
-                        if pos != -1:
-                            # 添加原文前的文本，保持原始格式
-                            if pos > current_pos:
-                                for i in range(current_pos, pos):
-                                    if i < len(char_to_format_map):
-                                        run_info = char_to_format_map[i]
-                                        run = p.add_run()
-                                        run.text = text[i]
-                                        # 应用原始格式
-                                        run.font.bold = run_info['bold']
-                                        run.font.italic = run_info['italic']
-                                        run.font.underline = run_info['underline']
-                                        if run_info['font']:
-                                            run.font.name = run_info['font']
-                                        if run_info['size']:
-                                            run.font.size = run_info['size']
-                                        if run_info['color']:
-                                            run.font.color.rgb = run_info['color']
-                                    else:
-                                        # 如果没有格式信息，则使用默认格式
-                                        run = p.add_run()
-                                        run.text = text[i]
-                            
-                            # 添加左方括号
-                            first_char_pos = pos
-                            if first_char_pos < len(char_to_format_map):
-                                base_run_info = char_to_format_map[first_char_pos]
-                                run = p.add_run()
-                                run.text = "["
-                                # 应用原始格式
-                                run.font.bold = base_run_info['bold']
-                                run.font.italic = base_run_info['italic']
-                                run.font.underline = base_run_info['underline']
-                                if base_run_info['font']:
-                                    run.font.name = base_run_info['font']
-                                if base_run_info['size']:
-                                    run.font.size = base_run_info['size']
-                                if base_run_info['color']:
-                                    run.font.color.rgb = base_run_info['color']
-                            else:
-                                # 如果没有格式信息，则使用默认格式
-                                run = p.add_run()
-                                run.text = "["
-                            
-                            # 添加原文，保持原始格式
-                            for i in range(pos, pos + len(original)):
-                                if i < len(char_to_format_map):
-                                    run_info = char_to_format_map[i]
-                                    run = p.add_run()
-                                    run.text = text[i]
-                                    # 应用原始格式
-                                    run.font.bold = run_info['bold']
-                                    run.font.italic = run_info['italic']
-                                    run.font.underline = run_info['underline']
-                                    if run_info['font']:
-                                        run.font.name = run_info['font']
-                                    if run_info['size']:
-                                        run.font.size = run_info['size']
-                                    if run_info['color']:
-                                        run.font.color.rgb = run_info['color']
-                                else:
-                                    # 如果没有格式信息，则使用默认格式
-                                    run = p.add_run()
-                                    run.text = text[i]
-                            
-                            # 添加右方括号
-                            last_char_pos = pos + len(original) - 1
-                            if last_char_pos < len(char_to_format_map):
-                                base_run_info = char_to_format_map[last_char_pos]
-                                run = p.add_run()
-                                run.text = "]"
-                                # 应用原始格式
-                                run.font.bold = base_run_info['bold']
-                                run.font.italic = base_run_info['italic']
-                                run.font.underline = base_run_info['underline']
-                                if base_run_info['font']:
-                                    run.font.name = base_run_info['font']
-                                if base_run_info['size']:
-                                    run.font.size = base_run_info['size']
-                                if base_run_info['color']:
-                                    run.font.color.rgb = base_run_info['color']
-                            else:
-                                # 如果没有格式信息，则使用默认格式
-                                run = p.add_run()
-                                run.text = "]"
-                            
-                            # 添加红色建议，使用圆括号包围，保持原文格式，仅颜色改为红色
-                            if last_char_pos < len(char_to_format_map):
-                                base_run_info = char_to_format_map[last_char_pos]
-                                run = p.add_run()
-                                run.text = f"({suggestion})"
-                                # 应用原始格式
-                                run.font.bold = base_run_info['bold']
-                                run.font.italic = base_run_info['italic']
-                                run.font.underline = base_run_info['underline']
-                                if base_run_info['font']:
-                                    run.font.name = base_run_info['font']
-                                if base_run_info['size']:
-                                    run.font.size = base_run_info['size']
-                                # 仅颜色设置为红色
-                                run.font.color.rgb = PPTRGBColor(255, 0, 0)
-                            else:
-                                # 如果没有格式信息，则使用默认格式，仅设置红色
-                                run = p.add_run()
-                                run.text = f"({suggestion})"
-                                run.font.color.rgb = PPTRGBColor(255, 0, 0)
-                            
-                            current_pos = pos + len(original)
+                    # 更新进度
+                    if slide_shapes:
+                        progress.advance(sum(len(text) for _, text in slide_shapes),
+                                         f"处理幻灯片 {slide_index+1}/{slide_count}", units=len(slide_shapes))
                     
-                    # 添加剩余文本，保持原始格式
-                    if current_pos < len(text):
-                        for i in range(current_pos, len(text)):
-                            if i < len(char_to_format_map):
-                                run_info = char_to_format_map[i]
-                                run = p.add_run()
-                                run.text = text[i]
-                                # 应用原始格式
-                                run.font.bold = run_info['bold']
-                                run.font.italic = run_info['italic']
-                                run.font.underline = run_info['underline']
-                                if run_info['font']:
-                                    run.font.name = run_info['font']
-                                if run_info['size']:
-                                    run.font.size = run_info['size']
-                                if run_info['color']:
-                                    run.font.color.rgb = run_info['color']
-                            else:
-                                # 如果没有格式信息，则使用默认格式
-                                run = p.add_run()
-                                run.text = text[i]
+                    if partial_saver is not None and slide_index + 1 < slide_count:
+                        # 每完成 PARTIAL_SLIDE_RANGE 张幻灯片算作一个边界
+                        partial_saver.maybe_save(at_boundary=(slide_index + 1) % PARTIAL_SLIDE_RANGE == 0)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+        
+        # 保存修订后的文件
+        progress.finish("保存文件...")
+        with profiler.stage("save"):
+            atomic_save(output_path, prs.save)
+    finally:
+        profiler.stop()
+    save_report(report, file_path)
+    
+    return output_path
+
+
+def rewrite_pptx_shape_inline(shape, text, spans):
+    """重建形状中的文本：在需要修改的原文外加方括号，并在其后添加红色建议
+
+    spans 为 check_text 返回的 (起始位置, 结束位置, 建议)。
+    """
+    from pptx.dml.color import RGBColor as PPTRGBColor
+    
+    # 保存原始格式信息
+    text_frame = shape.text_frame
+    original_paragraphs = []
+
+    for paragraph in text_frame.paragraphs:
+        p_info = {
+            'text': paragraph.text,
+            'alignment': paragraph.alignment,
+            'level': paragraph.level,
+            'runs': []
+        }
+
+        for run in paragraph.runs:
+            run_info = {
+                'text': run.text,
+                'bold': run.font.bold,
+                'italic': run.font.italic,
+                'underline': run.font.underline,
+                'font': run.font.name,
+                'size': run.font.size,
+                'color': run.font.color.rgb if hasattr(run.font.color, 'rgb') else None
+            }
+            p_info['runs'].append(run_info)
+
+        original_paragraphs.append(p_info)
+
+    # 构建字符位置到格式的映射
+    char_to_format_map = []
+    current_pos = 0
+
+    for p_info in original_paragraphs:
+        for run_info in p_info['runs']:
+            run_text = run_info['text']
+            for _ in range(len(run_text)):
+                char_to_format_map.append(run_info)
+                current_pos += 1
+
+    # 清除所有段落
+    while len(text_frame.paragraphs) > 0:
+        p = text_frame.paragraphs[0]
+        p._element.getparent().remove(p._element)
+
+    # 创建新段落
+    p = text_frame.add_paragraph()
+    # 应用原始段落格式（使用第一个段落的格式）
+    if original_paragraphs:
+        p.alignment = original_paragraphs[0]['alignment']
+        p.level = original_paragraphs[0]['level']
+
+    # 重新添加文本，并在需要修改的地方添加红色建议
+    current_pos = 0
+    for pos, end, suggestion in spans:
+        original = text[pos:end]
+        # 添加原文前的文本，保持原始格式
+        if pos > current_pos:
+            for i in range(current_pos, pos):
+                if i < len(char_to_format_map):
+                    run_info = char_to_format_map[i]
+                    run = p.add_run()
+                    run.text = text[i]
+                    # 应用原始格式
+                    run.font.bold = run_info['bold']
+                    run.font.italic = run_info['italic']
+                    run.font.underline = run_info['underline']
+                    if run_info['font']:
+                        run.font.name = run_info['font']
+                    if run_info['size']:
+                        run.font.size = run_info['size']
+                    if run_info['color']:
+                        run.font.color.rgb = run_info['color']
+                else:
+                    # 如果没有格式信息，则使用默认格式
+                    run = p.add_run()
+                    run.text = text[i]
+
+        # 添加左方括号
+        first_char_pos = pos
+        if first_char_pos < len(char_to_format_map):
+            base_run_info = char_to_format_map[first_char_pos]
+            run = p.add_run()
+            run.text = "["
+            # 应用原始格式
+            run.font.bold = base_run_info['bold']
+            run.font.italic = base_run_info['italic']
+            run.font.underline = base_run_info['underline']
+            if base_run_info['font']:
+                run.font.name = base_run_info['font']
+            if base_run_info['size']:
+                run.font.size = base_run_info['size']
+            if base_run_info['color']:
+                run.font.color.rgb = base_run_info['color']
+        else:
+            # 如果没有格式信息，则使用默认格式
+            run = p.add_run()
+            run.text = "["
+
+        # 添加原文，保持原始格式
+        for i in range(pos, pos + len(original)):
+            if i < len(char_to_format_map):
+                run_info = char_to_format_map[i]
+                run = p.add_run()
+                run.text = text[i]
+                # 应用原始格式
+                run.font.bold = run_info['bold']
+                run.font.italic = run_info['italic']
+                run.font.underline = run_info['underline']
+                if run_info['font']:
+                    run.font.name = run_info['font']
+                if run_info['size']:
+                    run.font.size = run_info['size']
+                if run_info['color']:
+                    run.font.color.rgb = run_info['color']
+            else:
+                # 如果没有格式信息，则使用默认格式
+                run = p.add_run()
+                run.text = text[i]
+
+        # 添加右方括号
+        last_char_pos = pos + len(original) - 1
+        if last_char_pos < len(char_to_format_map):
+            base_run_info = char_to_format_map[last_char_pos]
+            run = p.add_run()
+            run.text = "]"
+            # 应用原始格式
+            run.font.bold = base_run_info['bold']
+            run.font.italic = base_run_info['italic']
+            run.font.underline = base_run_info['underline']
+            if base_run_info['font']:
+                run.font.name = base_run_info['font']
+            if base_run_info['size']:
+                run.font.size = base_run_info['size']
+            if base_run_info['color']:
+                run.font.color.rgb = base_run_info['color']
+        else:
+            # 如果没有格式信息，则使用默认格式
+            run = p.add_run()
+            run.text = "]"
+
+        # 添加红色建议，使用圆括号包围，保持原文格式，仅颜色改为红色
+        if last_char_pos < len(char_to_format_map):
+            base_run_info = char_to_format_map[last_char_pos]
+            run = p.add_run()
+            run.text = f"({suggestion})"
+            # 应用原始格式
+            run.font.bold = base_run_info['bold']
+            run.font.italic = base_run_info['italic']
+            run.font.underline = base_run_info['underline']
+            if base_run_info['font']:
+                run.font.name = base_run_info['font']
+            if base_run_info['size']:
+                run.font.size = base_run_info['size']
+            # 仅颜色设置为红色
+            run.font.color.rgb = PPTRGBColor(255, 0, 0)
+        else:
+            # 如果没有格式信息，则使用默认格式，仅设置红色
+            run = p.add_run()
+            run.text = f"({suggestion})"
+            run.font.color.rgb = PPTRGBColor(255, 0, 0)
+
+        current_pos = pos + len(original)
+
+    # 添加剩余文本，保持原始格式
+    if current_pos < len(text):
+        for i in range(current_pos, len(text)):
+            if i < len(char_to_format_map):
+                run_info = char_to_format_map[i]
+                run = p.add_run()
+                run.text = text[i]
+                # 应用原始格式
+                run.font.bold = run_info['bold']
+                run.font.italic = run_info['italic']
+                run.font.underline = run_info['underline']
+                if run_info['font']:
+                    run.font.name = run_info['font']
+                if run_info['size']:
+                    run.font.size = run_info['size']
+                if run_info['color']:
+                    run.font.color.rgb = run_info['color']
+            else:
+                # 如果没有格式信息，则使用默认格式
+                run = p.add_run()
+                run.text = text[i]
+
+
+def process_excel(file_path, progress_callback=None, cancel_event=None, row_callback=None, token_ledger=None):
+    """处理Excel工作簿
+
+    以只读模式逐行流式读取文本单元格，相同的文本（共享字符串）只检查一次；内存占用与工作表行数基本无关。
+    修订文件由原工作簿逐个部件复制而来，只为有建议的单元格添加批注（单元格已有批注时在其后追加），
+    单元格数据、样式、隐藏的工作表、冻结窗格、行高列宽、合并单元格、超链接、数据验证、图表和图片都保持不变。
+    """
+    from openpyxl import load_workbook
+    from xlsx_comments import write_commented_workbook
+    
+    source = load_workbook(file_path, read_only=True)
+    report = ProcessingReport(file_path, row_callback=row_callback, token_ledger=token_ledger)
+    cache = {}
+    # 每个工作表中需要添加的批注 [(单元格坐标, 批注文本)]
+    annotations = {}
+    
+    try:
+        sheet_count = len(source.worksheets)
+        # 流式读取时无法预先统计文本，按行数计算进度
+        progress = ProgressReporter(progress_callback,
+                                    total_weight=sum(sheet.max_row or 0 for sheet in source.worksheets))
+        for sheet_index, sheet in enumerate(source.worksheets):
+            total_rows = sheet.max_row or 0
+            sheet_annotations = annotations.setdefault(sheet.title, [])
+            
+            for row_index, row in enumerate(sheet.iter_rows(), start=1):
+                for cell in row:
+                    if cell.data_type == "s" and cell.value and cell.value.strip():
+                        check_cancelled(cancel_event)
+                        location = f"工作表 {sheet.title} 单元格 {cell.coordinate}"
+                        spans = check_text(cell.value, location, report, cache, progress)
+                        if spans:
+                            lines = [f"{cell.value[start:end]} → {suggestion}" for start, end, suggestion in spans]
+                            sheet_annotations.append((cell.coordinate, "建议修改：\n" + "\n".join(lines)))
                 
                 # 更新进度
-                processed_items += 1
-                if progress_callback:
-                    progress_percent = int((processed_items / total_items) * 100)
-                    progress_callback(progress_percent, f"处理幻灯片 {slide_index+1}/{len(prs.slides)}, 形状 {processed_items}/{total_items}")
+                progress.advance(1, f"处理工作表 {sheet_index+1}/{sheet_count}, 行 {row_index}/{total_rows}")
+    finally:
+        source.close()
     
     # 保存修订后的文件
-    if progress_callback:
-        progress_callback(100, "保存文件...")
+    progress.finish("保存文件...")
     output_path = get_output_path(file_path)
-    prs.save(output_path)
+    atomic_save(output_path, lambda path: write_commented_workbook(file_path, path, annotations))
+    save_report(report, file_path)
     
     return output_path
 
 
-
-
-
 def get_output_path(file_path):
     """获取输出文件路径"""
     file_path = Path(file_path)
@@ -793,4 +927,16 @@ def get_output_path(file_path):
     directory = file_path.parent
     
     output_path = directory / f"{stem}_修订{suffix}"
-    return output_path
\ No newline at end of file
+    return output_path
+
+
+def get_check_report_path(file_path, report_format="jsonl"):
+    """获取仅检查模式下的检查报告文件路径"""
+    file_path = Path(file_path)
+    return file_path.parent / f"{file_path.stem}_检查报告.{report_format}"
+
+
+def get_report_path(file_path):
+    """获取检查报告文件路径"""
+    file_path = Path(file_path)
+    return file_path.parent / f"{file_path.stem}_修订报告.json"
\ No newline at end of file
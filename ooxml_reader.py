@@ -0,0 +1,221 @@
+import posixpath
+import zipfile
+
+from lxml import etree
+
+# 命名空间
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def _w(tag):
+    return f"{{{W_NS}}}{tag}"
+
+
+def _a(tag):
+    return f"{{{A_NS}}}{tag}"
+
+
+def _p(tag):
+    return f"{{{P_NS}}}{tag}"
+
+
+class _CountingReader:
+    """包装压缩包内的文件流，记录已读取的字节数，用于估算进度"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def word_run_text(r):
+    """与 python-docx 的 Run.text 保持一致"""
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == _w("t"):
+            parts.append(child.text or "")
+        elif tag in (_w("tab"), _w("ptab")):
+            parts.append("\t")
+        elif tag == _w("cr"):
+            parts.append("\n")
+        elif tag == _w("br"):
+            if child.get(_w("type"), "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag == _w("noBreakHyphen"):
+            parts.append("-")
+    return "".join(parts)
+
+
+def word_paragraph_text(p):
+    """与 python-docx 的 Paragraph.text 保持一致"""
+    parts = []
+    for child in p:
+        if child.tag == _w("r"):
+            parts.append(word_run_text(child))
+        elif child.tag == _w("hyperlink"):
+            for r in child.iterchildren(_w("r")):
+                parts.append(word_run_text(r))
+    return "".join(parts)
+
+
+def iter_word_units(file_path, progress_callback=None):
+    """以只读流式方式逐个读取Word文档中的段落，生成 (位置, 文本)
+
+    不构建 python-docx 对象树，已读取的元素会被及时释放，内存占用与文档大小基本无关。
+    只读取正文段落和顶层表格单元格中的段落，与 process_word 的处理范围一致。
+    """
+    with zipfile.ZipFile(file_path) as package:
+        info = package.getinfo("word/document.xml")
+        stream = _CountingReader(package.open(info))
+
+        paragraph_index = 0
+        table_index = 0
+        # 顶层表格中的行号和列号（列号按网格列计算，与 python-docx 的 row.cells 一致）
+        row_index = cell_column = 0
+        table_depth = 0
+        in_body = False
+
+        events = etree.iterparse(stream, events=("start", "end"))
+        for event, element in events:
+            tag = element.tag
+
+            if event == "start":
+                if tag == _w("body"):
+                    in_body = True
+                elif tag == _w("tbl"):
+                    table_depth += 1
+                    if table_depth == 1:
+                        row_index = 0
+                elif tag == _w("tr") and table_depth == 1:
+                    row_index += 1
+                    cell_column = 0
+                continue
+
+            if not in_body:
+                continue
+
+            if tag == _w("p"):
+                parent = element.getparent()
+                location = None
+                if parent.tag == _w("body"):
+                    paragraph_index += 1
+                    location = f"段落 {paragraph_index}"
+                elif parent.tag == _w("tc") and table_depth == 1:
+                    location = f"表格 {table_index+1} 第{row_index}行第{cell_column+1}列"
+
+                if location is not None:
+                    text = word_paragraph_text(element)
+                    if text.strip():
+                        yield location, text
+
+                    if progress_callback:
+                        percent = int(stream.bytes_read / max(info.file_size, 1) * 100)
+                        progress_callback(min(percent, 99), f"正在检查 {location}")
+
+                if parent.tag == _w("body"):
+                    element.clear()
+            elif tag == _w("tc") and table_depth == 1:
+                grid_span = element.find(f"{_w('tcPr')}/{_w('gridSpan')}")
+                cell_column += int(grid_span.get(_w("val"))) if grid_span is not None else 1
+            elif tag == _w("tbl"):
+                table_depth -= 1
+                if table_depth == 0:
+                    table_index += 1
+                    element.clear()
+
+            # 释放正文中已经处理完的顶层元素
+            if element.getparent() is not None and element.getparent().tag == _w("body"):
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+
+def _pptx_paragraph_text(p):
+    """与 python-pptx 的 _Paragraph.text 保持一致"""
+    parts = []
+    for child in p:
+        if child.tag in (_a("r"), _a("fld")):
+            t = child.find(_a("t"))
+            parts.append((t.text or "") if t is not None else "")
+        elif child.tag == _a("br"):
+            parts.append("\v")
+    return "".join(parts)
+
+
+def _slide_part_names(package):
+    """按演示文稿中的顺序返回幻灯片部件名"""
+    presentation = etree.fromstring(package.read("ppt/presentation.xml"))
+    rels = etree.fromstring(package.read("ppt/_rels/presentation.xml.rels"))
+    targets = {
+        rel.get("Id"): rel.get("Target")
+        for rel in rels.iterchildren(f"{{{PKG_REL_NS}}}Relationship")
+    }
+
+    part_names = []
+    slide_id_list = presentation.find(_p("sldIdLst"))
+    if slide_id_list is None:
+        return part_names
+    for slide_id in slide_id_list.iterchildren(_p("sldId")):
+        target = targets[slide_id.get(f"{{{R_NS}}}id")]
+        part_names.append(posixpath.normpath(posixpath.join("ppt", target)))
+    return part_names
+
+
+def iter_powerpoint_units(file_path, progress_callback=None):
+    """以只读方式逐张读取幻灯片中文本形状的文本，生成 (位置, 文本)
+
+    每次只解析一张幻灯片的XML，处理范围与 process_powerpoint 一致（幻灯片顶层的文本形状）。
+    """
+    with zipfile.ZipFile(file_path) as package:
+        part_names = _slide_part_names(package)
+        for slide_index, part_name in enumerate(part_names):
+            slide = etree.fromstring(package.read(part_name))
+            sp_tree = slide.find(f"{_p('cSld')}/{_p('spTree')}")
+            if sp_tree is not None:
+                for sp in sp_tree.iterchildren(_p("sp")):
+                    c_nv_pr = sp.find(f"{_p('nvSpPr')}/{_p('cNvPr')}")
+                    name = c_nv_pr.get("name", "") if c_nv_pr is not None else ""
+                    tx_body = sp.find(_p("txBody"))
+                    if tx_body is None:
+                        continue
+                    text = "\n".join(
+                        _pptx_paragraph_text(p) for p in tx_body.iterchildren(_a("p"))
+                    )
+                    if text.strip():
+                        yield f"幻灯片 {slide_index+1} 形状 {name}", text
+
+            if progress_callback:
+                percent = int((slide_index + 1) / len(part_names) * 100)
+                progress_callback(min(percent, 99), f"已检查幻灯片 {slide_index+1}/{len(part_names)}")
+            del slide
+
+
+def iter_excel_units(file_path, progress_callback=None):
+    """以 openpyxl 只读模式逐行读取工作簿中的文本单元格，生成 (位置, 文本)
+
+    公式、数字、日期等非文本单元格会被跳过。
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        sheet_count = len(workbook.worksheets)
+        for sheet_index, sheet in enumerate(workbook.worksheets):
+            for row in sheet.iter_rows():
+                for cell in row:
+                    if cell.data_type == "s" and cell.value and cell.value.strip():
+                        yield f"工作表 {sheet.title} 单元格 {cell.coordinate}", cell.value
+
+            if progress_callback:
+                percent = int((sheet_index + 1) / sheet_count * 100)
+                progress_callback(min(percent, 99), f"已检查工作表 {sheet_index+1}/{sheet_count}")
+    finally:
+        workbook.close()
@@ -0,0 +1,136 @@
+import threading
+import time
+
+
+def format_duration(seconds):
+    """把秒数格式化为“1小时2分”“3分4秒”“5秒”之类的文本"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}小时{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    return f"{seconds}秒"
+
+
+class ProgressReporter:
+    """合并进度更新，并估算剩余时间和处理速度
+
+    进度按字符数（权重）而不是文本单元数计算；两次回调之间至少间隔 min_interval 秒，
+    避免逐段落触发回调。间隔内的更新不会被丢弃：只保留最新的一次，在间隔结束时由定时器发出
+    （或被之后的更新取代），最后的状态总会显示出来。剩余时间和速度根据API延迟的指数移动平均值估算。
+    """
+
+    def __init__(self, callback, total_weight=0, total_units=0, min_interval=0.25,
+                 smoothing=0.2, concurrency=1):
+        self.callback = callback
+        self.total_weight = total_weight
+        self.total_units = total_units
+        self.min_interval = min_interval
+        self.smoothing = smoothing
+        self.concurrency = concurrency
+
+        self.done_weight = 0
+        self.done_units = 0
+        self.latency_average = None
+        self.start_time = time.monotonic()
+        self._last_emit = None
+        # 因频率限制推迟的最新一次更新 (百分比, 消息)，以及发出它的定时器
+        self._pending = None
+        self._flush_timer = None
+        self._emit_lock = threading.Lock()
+        # API调用可能在多个线程中并行进行
+        self._latency_lock = threading.Lock()
+
+    def observe_latency(self, seconds):
+        """记录一次API调用的耗时（可以在多个线程中调用）"""
+        with self._latency_lock:
+            if self.latency_average is None:
+                self.latency_average = seconds
+            else:
+                self.latency_average += self.smoothing * (seconds - self.latency_average)
+
+    def throughput(self):
+        """处理速度（文本单元/秒）"""
+        if self.latency_average:
+            return self.concurrency / self.latency_average
+        elapsed = time.monotonic() - self.start_time
+        return self.done_units / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self, percent):
+        """估算剩余时间（秒），无法估算时返回None"""
+        if self.latency_average is not None and self.total_units:
+            remaining_units = max(self.total_units - self.done_units, 0)
+            return remaining_units * self.latency_average / self.concurrency
+        if percent > 0:
+            elapsed = time.monotonic() - self.start_time
+            return elapsed * (100 - percent) / percent
+        return None
+
+    def percent(self):
+        if not self.total_weight:
+            return 0
+        return min(int(self.done_weight / self.total_weight * 100), 100)
+
+    def advance(self, weight, message, units=1):
+        """完成一个文本单元，weight 通常为该单元的字符数"""
+        self.done_weight += weight
+        self.done_units += units
+        self._emit(self.percent(), message)
+
+    def update(self, percent, message):
+        """直接报告进度百分比（用于无法预先计算总权重的流式处理）"""
+        self._emit(percent, message)
+
+    def finish(self, message):
+        """报告最终进度，不受频率限制；尚未发出的更新被最终进度取代"""
+        self._emit(100, message, force=True)
+        self.close()
+
+    def close(self):
+        """丢弃尚未发出的更新并停止定时器，之后不会再从定时器线程调用回调"""
+        with self._emit_lock:
+            self._pending = None
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+    def _emit(self, percent, message, force=False):
+        if self.callback is None:
+            return
+
+        with self._emit_lock:
+            now = time.monotonic()
+            if not force and self._last_emit is not None and now - self._last_emit < self.min_interval:
+                self._pending = (percent, message)
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.min_interval - (now - self._last_emit),
+                                                        self._flush_pending)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+            self._send(percent, message, force)
+
+    def _flush_pending(self):
+        with self._emit_lock:
+            # 已被 close 取消、但取消前已经开始运行的定时器
+            if self._flush_timer is not threading.current_thread():
+                return
+            self._flush_timer = None
+            if self._pending is not None:
+                self._send(*self._pending)
+
+    def _send(self, percent, message, force=False):
+        """在持有 _emit_lock 时调用回调"""
+        self._pending = None
+        self._last_emit = time.monotonic()
+
+        if not force:
+            eta = self.eta_seconds(percent)
+            details = []
+            if eta is not None:
+                details.append(f"剩余约 {format_duration(eta)}")
+            if self.done_units:
+                details.append(f"{self.throughput():.1f} 个/秒")
+            if details:
+                message = f"{message}（{'，'.join(details)}）"
+        self.callback(percent, message)
@@ -0,0 +1,245 @@
+from suggestion_matcher import AhoCorasick
+from token_accounting import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, estimate_tokens
+
+# OpenAI只缓存达到该长度（token数）的提示词前缀
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# 校对说明。系统提示词在整个进程中保持逐字节不变（不含日期、文件名等随请求变化的内容），
+# 服务端可以缓存这部分输入，每个文本单元只有用户消息中的文本本身不同。
+INSTRUCTIONS = """你是一位专业的中文校对助手，负责检查办公文档（Word文档、PowerPoint演示文稿、Excel工作簿）中的文字。用户每次发送一段从文档中提取的文本，你只检查这段文本。
+
+需要指出的问题：
+1. 错别字：形近字、音近字误用，例如“再接再励”应为“再接再厉”，更多例子见下方的常见错误写法。
+2. 常见的词语误用：“的”“地”“得”混用，“做”“作”混用，“即”“既”混用等。
+3. 明显的语法错误：成分残缺、搭配不当、语序不当、重复用词。
+4. 标点错误：中文语境中误用英文标点、标点重复、括号或引号不成对。
+
+不需要修改的内容：
+1. 不要润色文风，不要改写表达正确的句子，不要统一同义词。
+2. 不要修改人名、地名、机构名、产品名、型号、代码、网址、邮箱、公式和数字。
+3. 不要修改英文单词的大小写，不要翻译外文。
+4. 术语表中列出的保留术语是正确写法，即使看起来像错别字也不要修改。
+5. 术语表中列出的不规范写法，应改为对应的规范写法。
+
+输出格式：
+1. 每个问题占一行，格式为：原文|修改后的文本
+2. “原文”必须从用户发送的文本中原样复制，保持字符完全一致，只包含需要修改的最短片段及必要的上下文，使它在文本中能够定位。
+3. “修改后的文本”是替换“原文”后的正确写法。
+4. 不要编号，不要解释原因，不要输出其他任何内容。
+5. 如果不需要修改，返回空字符串。
+
+常见的错误写法（每行左侧为错误写法，右侧为正确写法）：
+按装|安装
+按步就班|按部就班
+病入膏盲|病入膏肓
+部份|部分
+布署|部署
+不径而走|不胫而走
+穿流不息|川流不息
+重迭|重叠
+粗旷|粗犷
+淡薄名利|淡泊名利
+渡假|度假
+发韧|发轫
+防碍|妨碍
+分部实施|分步实施
+复盖|覆盖
+甘败下风|甘拜下风
+既使|即使
+坚苦|艰苦
+娇揉造作|矫揉造作
+截止到目前|截至目前
+金榜提名|金榜题名
+精兵减政|精兵简政
+滥竽冲数|滥竽充数
+连系|联系
+流览|浏览
+默守成规|墨守成规
+迫不急待|迫不及待
+一股作气|一鼓作气
+通迅|通讯
+相辅相承|相辅相成
+消毁|销毁
+修茸|修葺
+一愁莫展|一筹莫展
+以经|已经
+再接再励|再接再厉
+针贬|针砭
+震憾|震撼
+直接了当|直截了当
+追朔|追溯
+座落|坐落
+
+易混用字词的用法：
+1. “的”用在名词前，修饰名词，如“美丽的风景”；“地”用在动词前，修饰动词，如“认真地检查”；“得”用在动词或形容词后，引出补语，如“写得清楚”“好得很”。
+2. “做”多用于具体的活动和制作，如“做工作”“做衣服”；“作”多用于抽象的、书面的说法，如“作报告”“作为”“当作”。
+3. “即”表示“就是”“就”，如“即日起”“即使”；“既”表示“已经”或与“又”“也”搭配，如“既然”“既定”“既……又……”。
+4. “截至”后接时间点，表示到该时间为止，如“截至六月底”；“截止”表示到期停止，后面一般不接时间，如“报名已于昨日截止”。
+5. “权利”指依法享有的利益，“权力”指支配和强制的力量；“启用”指开始使用，“起用”指重新任用人员。
+
+判断原则：
+1. 只在确定有误时才指出，拿不准的写法不要修改。
+2. 同一个错误在文本中出现多次时，每处分别列出一行，“原文”中带上足够的上下文以区分不同的出现位置。
+3. 一处错误只列出一次，不要用不同的“原文”重复指出同一处错误。
+4. “原文”中不要包含换行；文本中的换行、制表符和多个空格保持原样，不要作为错误指出。
+5. 文本可能是表格单元格、幻灯片标题或列表项等不完整的句子，缺少主语或句末标点不算错误。
+6. 文本中混有英文、数字和单位时，只检查中文部分和中英文之间的标点。
+
+示例一：
+文本：我们要再接再励，把这项工作做的更好。
+输出：
+再接再励|再接再厉
+做的更好|做得更好
+
+示例二：
+文本：截止到目前，系统已复盖全部门店，以经完成按装。
+输出：
+截止到目前|截至目前
+复盖|覆盖
+以经|已经
+按装|安装
+
+示例三：
+文本：第三季度销售额同比增长12.5%，详见附表2。
+输出：（没有需要修改的内容，返回空字符串）
+
+示例四：
+文本：请各部门于周五前提交报告,并抄送人力资源部。
+输出：
+报告,并|报告，并
+
+示例五：
+文本：项目分部实施：一期布署核心系统；二期布署外围系统。
+输出：
+分部实施|分步实施
+一期布署|一期部署
+二期布署|二期部署"""
+
+
+class Glossary:
+    """术语表：保留的术语（不应被修改）和不规范写法对应的规范写法
+
+    术语表文件为UTF-8文本，每行一个条目，空行和以“#”开头的行被忽略：
+    “术语”表示保留该术语；“不规范写法=>规范写法”表示应改为规范写法，规范写法同样被保留。
+    """
+
+    def __init__(self, terms=(), preferred=None):
+        # 排序去重，相同内容的术语表总是生成相同的提示词
+        self.terms = sorted({term for term in terms if term})
+        self.preferred = dict(sorted((preferred or {}).items()))
+        self.protected = sorted(set(self.terms) | set(self.preferred.values()))
+        self._matcher = AhoCorasick(self.protected) if self.protected else None
+
+    @classmethod
+    def load(cls, path):
+        terms = []
+        preferred = {}
+        with open(path, encoding="utf-8-sig") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if "=>" in line:
+                    variant, canonical = (part.strip() for part in line.split("=>", 1))
+                    if variant and canonical:
+                        preferred[variant] = canonical
+                else:
+                    terms.append(line)
+        return cls(terms, preferred)
+
+    def __bool__(self):
+        return bool(self.terms or self.preferred)
+
+    def __len__(self):
+        return len(self.terms) + len(self.preferred)
+
+    def split_hits(self, text, spans):
+        """去掉会改动保留术语的建议
+
+        spans 为 match_suggestions 返回的 (起始位置, 结束位置, 建议)。原文与文本中某处保留术语重叠，
+        且建议没有完整保留该术语时，这条建议不能写在这个位置：原文在文本中的其他位置还有不涉及
+        保留术语、也未被其他建议占用的出现时，改为定位到其中第一处，否则抑制这条建议。
+        返回 (按位置排列的 spans, 被抑制的 (原文, 建议) 列表)。
+        """
+        if self._matcher is None or not spans:
+            return spans, []
+        occurrences = [(start, start + len(self.protected[index]), self.protected[index])
+                       for start, index in self._matcher.iter_matches(text)]
+        if not occurrences:
+            return spans, []
+
+        def touches_term(start, end, suggestion):
+            return any(term_start < end and start < term_end
+                       and not (start <= term_start and term_end <= end and term in suggestion)
+                       for term_start, term_end, term in occurrences)
+
+        kept = []
+        blocked = []
+        for start, end, suggestion in spans:
+            if touches_term(start, end, suggestion):
+                blocked.append((start, end, suggestion))
+            else:
+                kept.append((start, end, suggestion))
+        if not blocked:
+            return spans, []
+
+        suppressed = []
+        for start, end, suggestion in blocked:
+            original = text[start:end]
+            position = text.find(original)
+            while position != -1:
+                candidate_end = position + len(original)
+                if (not touches_term(position, candidate_end, suggestion)
+                        and all(candidate_end <= kept_start or kept_end <= position
+                                for kept_start, kept_end, _ in kept)):
+                    kept.append((position, candidate_end, suggestion))
+                    break
+                position = text.find(original, position + 1)
+            else:
+                suppressed.append((original, suggestion))
+        kept.sort()
+        return kept, suppressed
+
+
+def build_system_prompt(glossary):
+    """由校对说明和术语表生成系统提示词，相同的术语表总是生成逐字节相同的结果"""
+    sections = [INSTRUCTIONS]
+    if glossary.terms:
+        sections.append("术语表（保留术语，不要修改）：\n" + "\n".join(glossary.terms))
+    if glossary.preferred:
+        sections.append("术语表（不规范写法=>规范写法）：\n" + "\n".join(
+            f"{variant}=>{canonical}" for variant, canonical in glossary.preferred.items()))
+    return "\n\n".join(sections)
+
+
+class PromptBuilder:
+    """构造校对请求：不变的系统提示词作为前缀，每个文本单元的内容只出现在用户消息中"""
+
+    def __init__(self, glossary=None):
+        self.glossary = glossary or Glossary()
+        self.system_prompt = build_system_prompt(self.glossary)
+        # 各模型下系统提示词的token数，只需计算一次
+        self._prefix_tokens = {}
+
+    def build_messages(self, text):
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": text}
+        ]
+
+    def prefix_tokens(self, model="gpt-4o-mini"):
+        """估算系统提示词（所有请求共用的前缀）的token数"""
+        if model not in self._prefix_tokens:
+            self._prefix_tokens[model] = TOKENS_PER_MESSAGE + estimate_tokens(self.system_prompt, model)
+        return self._prefix_tokens[model]
+
+    def estimate_prompt_tokens(self, text, model="gpt-4o-mini"):
+        """估算一次请求的输入token数：共用的前缀、用户消息及聊天格式的开销"""
+        return self.prefix_tokens(model) + TOKENS_PER_MESSAGE + estimate_tokens(text, model) + TOKENS_PER_REPLY
+
+    def estimate_completion_tokens(self, text, model="gpt-4o-mini"):
+        """估算一次请求的输出token数，用于预留预算
+
+        回复只列出需要修改的片段及修改后的文本，按文本本身的token数估算，通常偏多。
+        """
+        return estimate_tokens(text, model)
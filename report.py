@@ -0,0 +1,128 @@
+import csv
+import json
+import threading
+
+from token_accounting import TokenLedger
+
+# 报告中每一行的字段
+REPORT_FIELDS = ["location", "original", "suggestion", "status"]
+
+
+class ProcessingReport:
+    """记录一次文档处理的检查结果
+
+    API不可用时，相应的文本单元不会被编造修改建议，而是记录为“未检查”。
+    """
+
+    def __init__(self, source_path, writer=None, row_callback=None, token_ledger=None):
+        self.source_path = str(source_path)
+        self.checked_units = 0
+        self.suggestion_count = 0
+        self.unanchored_count = 0
+        self.glossary_count = 0
+        self.unchecked = []
+        # 可选的流式写出器，每条结果产生后立即写出
+        self.writer = writer
+        # 可选的回调 row_callback(location, original, suggestion, status)，例如用于界面实时显示结果
+        self.row_callback = row_callback
+        # 本文档的token用量和预算（token_accounting.TokenLedger）
+        self.token_ledger = token_ledger or TokenLedger()
+        # 可选的各处理阶段内存使用（memory_profile.MemoryProfiler.stages）
+        self.memory_stages = []
+        # 多个线程可能同时记录检查结果（例如并行检查幻灯片）
+        self._lock = threading.Lock()
+
+    def _emit_row(self, location, original, suggestion, status):
+        if self.writer is not None:
+            self.writer.write_row(location, original, suggestion, status)
+        if self.row_callback is not None:
+            self.row_callback(location, original, suggestion, status)
+
+    def mark_checked(self, location, suggestions, unanchored=(), glossary_hits=()):
+        """记录一个已完成检查的文本单元
+
+        unanchored 为原文在文本中找不到、因而无法标注的建议，以“unanchored”状态记录；
+        glossary_hits 为会改动术语表中保留术语、因而被抑制的建议，以“glossary”状态记录。
+        """
+        with self._lock:
+            self.checked_units += 1
+            self.suggestion_count += len(suggestions)
+            self.unanchored_count += len(unanchored)
+            self.glossary_count += len(glossary_hits)
+            for original, suggestion in suggestions:
+                self._emit_row(location, original, suggestion, "suggested")
+            for original, suggestion in unanchored:
+                self._emit_row(location, original, suggestion, "unanchored")
+            for original, suggestion in glossary_hits:
+                self._emit_row(location, original, suggestion, "glossary")
+
+    def mark_unchecked(self, location, text, reason):
+        """记录一个未能检查的文本单元"""
+        with self._lock:
+            self.unchecked.append({
+                "location": location,
+                "text": text,
+                "reason": reason,
+            })
+            self._emit_row(location, text, "", "unchecked")
+
+    def to_dict(self):
+        return {
+            "source": self.source_path,
+            "checked_units": self.checked_units,
+            "unchecked_units": len(self.unchecked),
+            "suggestions": self.suggestion_count,
+            "unanchored_suggestions": self.unanchored_count,
+            "glossary_suppressed_suggestions": self.glossary_count,
+            "unchecked": self.unchecked,
+            "token_usage": self.token_ledger.to_dict(),
+            "memory": self.memory_stages,
+        }
+
+    def save(self, path):
+        """将报告保存为JSON文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+
+class ReportWriter:
+    """以流式方式写出检查结果（位置、原文、建议），支持 jsonl 和 csv 两种格式
+
+    每写一行就刷新到文件，处理中途即可查看已有结果，内存中不保留结果列表。
+    """
+
+    FORMATS = ("jsonl", "csv")
+
+    def __init__(self, path, report_format="jsonl"):
+        if report_format not in self.FORMATS:
+            raise ValueError(f"不支持的报告格式: {report_format}")
+
+        self.path = path
+        self.report_format = report_format
+        self.rows_written = 0
+        # csv 使用 utf-8-sig 编码，便于 Excel 正确识别中文
+        encoding = "utf-8-sig" if report_format == "csv" else "utf-8"
+        self._file = open(path, "w", encoding=encoding, newline="")
+        self._csv_writer = None
+        if report_format == "csv":
+            self._csv_writer = csv.writer(self._file)
+            self._csv_writer.writerow(REPORT_FIELDS)
+
+    def write_row(self, location, original, suggestion, status):
+        if self._csv_writer is not None:
+            self._csv_writer.writerow([location, original, suggestion, status])
+        else:
+            row = dict(zip(REPORT_FIELDS, [location, original, suggestion, status]))
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.rows_written += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,378 @@
+import argparse
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import office_processor
+from office_processor import ANNOTATION_MODES, ANNOTATION_INLINE, ProcessingCancelled
+from report import ReportWriter
+from token_accounting import process_usage
+
+# 支持的文件格式
+SUPPORTED_EXTENSIONS = (".docx", ".pptx", ".xlsx")
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_DONE, JOB_ERROR, JOB_CANCELLED)
+
+# 计算吞吐量的时间窗口（秒）
+THROUGHPUT_WINDOW = 300
+
+
+class QueueFullError(Exception):
+    """等待队列已满，暂时不能接受新任务"""
+
+
+class ServiceJob:
+    """服务中的一个文档处理任务"""
+
+    def __init__(self, file_name, input_path, options):
+        self.id = uuid.uuid4().hex
+        self.file_name = file_name
+        self.input_path = input_path
+        self.options = options
+        self.status = JOB_QUEUED
+        self.progress = 0
+        self.message = ""
+        self.output_path = None
+        self.suggestion_count = 0
+        self.unchecked_count = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        # 本任务的token用量和预算
+        self.token_ledger = office_processor.new_token_ledger(options.pop("token_budget", None))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "file_name": self.file_name,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "suggestions": self.suggestion_count,
+            "unchecked_units": self.unchecked_count,
+            "tokens": self.token_ledger.summary(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result_url": f"/jobs/{self.id}/result" if self.status == JOB_DONE else None,
+        }
+
+
+class JobService:
+    """有界的文档处理队列
+
+    所有任务在同一个进程中由 workers 个线程处理，共用OpenAI客户端、对冲策略和熔断器。
+    等待队列最多容纳 queue_size 个任务，队列已满时 submit 抛出 QueueFullError；
+    等待中的任务被取消时立即移出队列，不再占用队列容量。
+    """
+
+    def __init__(self, data_dir, workers=2, queue_size=16, job_ttl=24 * 3600):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.job_ttl = job_ttl
+
+        self.jobs = {}
+        self.rejected_count = 0
+        # 等待中的任务，只在持有 _lock 时访问
+        self._pending = deque()
+        self._finished_times = deque()
+        self._lock = threading.Lock()
+        self._pending_ready = threading.Condition(self._lock)
+        self._threads = [
+            threading.Thread(target=self._worker_loop, name=f"job-worker-{index+1}", daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, file_name, data, options):
+        """保存上传的文档并加入队列，返回任务；队列已满时抛出 QueueFullError"""
+        self._purge_expired()
+
+        job_dir = Path(tempfile.mkdtemp(prefix="job_", dir=self.data_dir))
+        input_path = job_dir / file_name
+        input_path.write_bytes(data)
+        job = ServiceJob(file_name, input_path, options)
+
+        with self._lock:
+            if len(self._pending) >= self.queue_size:
+                self.rejected_count += 1
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise QueueFullError("等待队列已满，请稍后重试")
+            self._pending.append(job)
+            self.jobs[job.id] = job
+            self._pending_ready.notify()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """取消任务：等待中的任务直接取消，处理中的任务在下一个文本单元前停止"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job.status == JOB_QUEUED:
+                self._pending.remove(job)
+                self._finish(job, JOB_CANCELLED, "已取消")
+            elif job.status == JOB_RUNNING:
+                job.cancel_event.set()
+                job.message = "正在取消"
+        return job
+
+    def metrics(self):
+        """队列深度、任务数和吞吐量"""
+        now = time.time()
+        with self._lock:
+            counts = {state: 0 for state in (JOB_QUEUED, JOB_RUNNING) + FINISHED_STATES}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+            while self._finished_times and self._finished_times[0] < now - THROUGHPUT_WINDOW:
+                self._finished_times.popleft()
+            recent = len(self._finished_times)
+            queue_depth = len(self._pending)
+
+        return {
+            "queue_depth": queue_depth,
+            "queue_capacity": self.queue_size,
+            "workers": self.workers,
+            "jobs": counts,
+            "rejected": self.rejected_count,
+            "jobs_per_minute": round(recent * 60 / THROUGHPUT_WINDOW, 2),
+            "tokens": process_usage.to_dict(),
+            "circuit_breaker": office_processor.breaker.state,
+            "hedging": office_processor.get_hedge_stats(),
+        }
+
+    def _finish(self, job, status, message):
+        job.status = status
+        job.message = message
+        job.finished_at = time.time()
+        self._finished_times.append(job.finished_at)
+
+    def _purge_expired(self):
+        """删除已结束超过 job_ttl 秒的任务及其文件"""
+        deadline = time.time() - self.job_ttl
+        with self._lock:
+            expired = [job for job in self.jobs.values()
+                       if job.status in FINISHED_STATES and job.finished_at < deadline]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.input_path.parent, ignore_errors=True)
+
+    def _worker_loop(self):
+        while True:
+            with self._pending_ready:
+                while not self._pending:
+                    self._pending_ready.wait()
+                job = self._pending.popleft()
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+            self._run(job)
+
+    def _run(self, job):
+        def progress_callback(percent, message):
+            # 进度更新可能由定时器稍后发出，任务结束后不再覆盖最终状态
+            if job.status != JOB_RUNNING:
+                return
+            job.progress = percent
+            if not job.cancel_event.is_set():
+                job.message = message
+
+        def row_callback(location, original, suggestion, status):
+            if status == "unchecked":
+                job.unchecked_count += 1
+            elif status == "suggested":
+                job.suggestion_count += 1
+
+        try:
+            output_path = office_processor.process_document(
+                job.input_path, progress_callback,
+                cancel_event=job.cancel_event,
+                row_callback=row_callback,
+                token_ledger=job.token_ledger,
+                **job.options,
+            )
+        except ProcessingCancelled:
+            with self._lock:
+                self._finish(job, JOB_CANCELLED, "已取消")
+        except Exception as e:
+            with self._lock:
+                self._finish(job, JOB_ERROR, str(e))
+        else:
+            with self._lock:
+                job.output_path = Path(output_path)
+                job.progress = 100
+                self._finish(job, JOB_DONE, "处理完成")
+
+
+def parse_bool(value):
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """HTTP接口
+
+    POST   /jobs?filename=xxx.docx    请求体为文档内容，返回任务信息（202）；队列已满时返回503
+    GET    /jobs/<id>                 任务状态和进度
+    GET    /jobs/<id>/result          下载修订文件（仅生成报告时为检查报告）
+    DELETE /jobs/<id>                 取消任务
+    GET    /metrics                   队列深度、任务数和吞吐量
+
+    POST /jobs 的其他查询参数：report_only、report_format、annotation_mode，含义同 process_document；
+    token_budget 指定本任务的token预算，不能超过配置中的预算。
+    """
+
+    service = None
+    max_upload_bytes = 100 * 1024 * 1024
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+        if path == "/metrics":
+            self._send_json(HTTPStatus.OK, self.service.metrics())
+            return
+
+        match = re.fullmatch(r"/jobs/([0-9a-f]+)(/result)?", path)
+        if not match:
+            self._send_error(HTTPStatus.NOT_FOUND, "接口不存在")
+            return
+        job = self.service.get(match.group(1))
+        if job is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+        elif match.group(2):
+            self._send_result(job)
+        else:
+            self._send_json(HTTPStatus.OK, job.to_dict())
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/jobs":
+            self._send_error(HTTPStatus.NOT_FOUND, "接口不存在")
+            return
+
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        file_name = Path(params.get("filename") or unquote(self.headers.get("X-Filename", ""))).name
+        if Path(file_name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+            self._send_error(HTTPStatus.BAD_REQUEST, "请通过filename参数提供.docx、.pptx或.xlsx文件名")
+            return
+
+        options = {
+            "report_only": parse_bool(params.get("report_only", "")),
+            "report_format": params.get("report_format", "jsonl"),
+            "annotation_mode": params.get("annotation_mode", ANNOTATION_INLINE),
+        }
+        if options["annotation_mode"] not in ANNOTATION_MODES:
+            self._send_error(HTTPStatus.BAD_REQUEST, f"不支持的标注方式: {options['annotation_mode']}")
+            return
+        if options["report_format"] not in ReportWriter.FORMATS:
+            self._send_error(HTTPStatus.BAD_REQUEST, f"不支持的报告格式: {options['report_format']}")
+            return
+        if params.get("token_budget"):
+            if not params["token_budget"].isdigit() or int(params["token_budget"]) == 0:
+                self._send_error(HTTPStatus.BAD_REQUEST, "token_budget必须是正整数")
+                return
+            options["token_budget"] = int(params["token_budget"])
+
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, "缺少Content-Length")
+            return
+        if length < 0:
+            self._send_error(HTTPStatus.BAD_REQUEST, "Content-Length无效")
+            return
+        if length > self.max_upload_bytes:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "文件过大")
+            return
+        data = self.rfile.read(length)
+
+        try:
+            job = self.service.submit(file_name, data, options)
+        except QueueFullError as e:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, str(e), {"Retry-After": "30"})
+            return
+        self._send_json(HTTPStatus.ACCEPTED, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+
+    def do_DELETE(self):
+        match = re.fullmatch(r"/jobs/([0-9a-f]+)", urlparse(self.path).path.rstrip("/"))
+        job = self.service.cancel(match.group(1)) if match else None
+        if job is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+        else:
+            self._send_json(HTTPStatus.OK, job.to_dict())
+
+    def _send_result(self, job):
+        if job.status != JOB_DONE:
+            self._send_error(HTTPStatus.CONFLICT, f"任务尚未完成（{job.status}）")
+            return
+
+        data = job.output_path.read_bytes()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition",
+                         f"attachment; filename*=UTF-8''{quote(job.output_path.name)}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {"error": message}, headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以HTTP服务方式运行错别字检查")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--workers", type=int, default=2, help="同时处理的任务数")
+    parser.add_argument("--queue-size", type=int, default=16, help="等待队列长度，队列已满时返回503")
+    parser.add_argument("--data-dir", default=str(Path(tempfile.gettempdir()) / "office_checker_jobs"),
+                        help="保存上传文件和处理结果的目录")
+    parser.add_argument("--max-upload-mb", type=int, default=100, help="上传文件大小上限（MB）")
+    args = parser.parse_args()
+
+    JobRequestHandler.service = JobService(args.data_dir, args.workers, args.queue_size)
+    JobRequestHandler.max_upload_bytes = args.max_upload_mb * 1024 * 1024
+
+    server = ThreadingHTTPServer((args.host, args.port), JobRequestHandler)
+    print(f"服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+
+def _read_umask():
+    # umask 只能通过设置来读取，在导入时（尚未启动其他线程）读取一次并立即恢复
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# 新建文件的默认权限
+_DEFAULT_FILE_MODE = 0o666 & ~_read_umask()
+
+
+def _target_mode(path):
+    """目标文件应有的权限：已存在时沿用原权限，否则与直接保存时新建的文件相同"""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        return _DEFAULT_FILE_MODE
+
+
+def atomic_save(path, save):
+    """先调用 save(临时文件路径) 保存到同目录下的临时文件，再替换目标文件
+
+    替换是原子操作，正在打开或复制目标文件的读者不会看到写了一半的文件。
+    临时文件以“~$”开头，与Office的临时文件一样会被文件扫描跳过。
+    """
+    path = Path(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f"~${path.stem}_", suffix=path.suffix, dir=path.parent)
+    os.close(fd)
+    try:
+        save(temp_path)
+        # mkstemp 创建的文件只有所有者可读写，改为与直接保存时相同的权限（已有目标文件时沿用其权限）
+        os.chmod(temp_path, _target_mode(path))
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class PartialSaver:
+    """处理过程中把已完成的部分保存为输出文件，审阅者可以先查看文档的前半部分
+
+    每完成一节（Word）或一组幻灯片（PowerPoint）时保存一次，两次保存至少间隔 min_gap 秒；
+    长时间没有到达这样的边界时，每隔 interval 秒保存一次。
+    """
+
+    def __init__(self, output_path, save, interval=60.0, min_gap=5.0, before_save=None):
+        self.output_path = output_path
+        self.save = save
+        self.interval = interval
+        self.min_gap = min_gap
+        # 保存前调用，例如先写入尚未写入文档的标注
+        self.before_save = before_save
+        self.snapshot_count = 0
+        self._last_save = time.monotonic()
+
+    def maybe_save(self, at_boundary=False):
+        """完成一个文本单元后调用；at_boundary 表示刚完成一节或一组幻灯片"""
+        elapsed = time.monotonic() - self._last_save
+        if elapsed >= self.interval or (at_boundary and elapsed >= self.min_gap):
+            self.save_now()
+
+    def save_now(self):
+        if self.before_save is not None:
+            self.before_save()
+        try:
+            atomic_save(self.output_path, self.save)
+            self.snapshot_count += 1
+            print(f"已保存已完成的部分: {self.output_path}")
+        except OSError as e:
+            # 目标文件可能正被其他程序占用，跳过本次保存，不影响处理
+            print(f"保存已完成的部分失败: {e}")
+        self._last_save = time.monotonic()
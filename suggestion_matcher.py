@@ -0,0 +1,88 @@
+from collections import deque, namedtuple
+
+# spans: 按位置排列的 (起始位置, 结束位置, 建议) 列表，互不重叠
+# unanchored: 在文本中找不到（或只能出现在已被占用的位置）的 (原文, 建议) 列表
+MatchResult = namedtuple("MatchResult", ["spans", "unanchored"])
+
+
+class AhoCorasick:
+    """多模式字符串匹配自动机，一次线性扫描找出所有模式在文本中的全部出现位置"""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        # 按广度优先顺序计算失败转移，并合并后缀状态的输出
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """依次返回 (起始位置, 模式序号)，按结束位置排列"""
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for index in self._output[state]:
+                yield position - len(self.patterns[index]) + 1, index
+
+
+def match_suggestions(text, suggestions):
+    """在文本中为每条建议定位一处原文
+
+    不依赖模型返回建议的顺序：所有原文构成一个自动机，一次扫描找出全部出现位置。
+    重叠时按确定的规则取舍：起始位置靠前的优先，起始位置相同时较长的原文优先；
+    同一原文被列出多次时，按列出顺序依次对应它在文本中的各处出现。
+    """
+    # 每个原文对应尚未定位的建议及其序号（按列出顺序）
+    waiting = {}
+    unanchored = []
+    for order, (original, suggestion) in enumerate(suggestions):
+        if original:
+            waiting.setdefault(original, deque()).append((order, suggestion))
+        else:
+            unanchored.append((order, original, suggestion))
+
+    spans = []
+    if waiting:
+        patterns = list(waiting)
+        lengths = [len(pattern) for pattern in patterns]
+        occurrences = sorted(AhoCorasick(patterns).iter_matches(text),
+                             key=lambda match: (match[0], -lengths[match[1]]))
+
+        last_end = 0
+        for start, index in occurrences:
+            pending = waiting[patterns[index]]
+            if start < last_end or not pending:
+                continue
+            last_end = start + lengths[index]
+            spans.append((start, last_end, pending.popleft()[1]))
+
+        for original, pending in waiting.items():
+            unanchored.extend((order, original, suggestion) for order, suggestion in pending)
+
+    unanchored.sort()
+    return MatchResult(spans, [(original, suggestion) for _, original, suggestion in unanchored])
@@ -0,0 +1,171 @@
+import math
+import os
+import re
+import sys
+import threading
+
+# 聊天接口中每条消息和回复的格式开销（近似值）
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# 中日韩文字及全角标点，大约每个字符一个token
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+_encodings = {}
+
+# 打包后的程序随程序分发的 tiktoken 编码文件目录（见 README“打包为可执行文件”）
+BUNDLED_TIKTOKEN_CACHE = "tiktoken_cache"
+
+
+def _use_bundled_tiktoken_cache():
+    """打包后的程序使用随程序分发的编码文件，不在运行时下载；已设置 TIKTOKEN_CACHE_DIR 时不覆盖"""
+    bundle_dir = getattr(sys, "_MEIPASS", None)
+    if bundle_dir is None or "TIKTOKEN_CACHE_DIR" in os.environ:
+        return
+    cache_dir = os.path.join(bundle_dir, BUNDLED_TIKTOKEN_CACHE)
+    if os.path.isdir(cache_dir):
+        os.environ["TIKTOKEN_CACHE_DIR"] = cache_dir
+
+
+def _get_encoding(model):
+    """返回模型对应的 tiktoken 编码；未安装 tiktoken 或无法加载编码时返回 None"""
+    if model not in _encodings:
+        try:
+            _use_bundled_tiktoken_cache()
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            encoding = None
+        _encodings[model] = encoding
+    return _encodings[model]
+
+
+def estimate_tokens(text, model="gpt-4o-mini"):
+    """估算文本的token数：安装了 tiktoken 时精确计算，否则按字符类型估算"""
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 4)
+
+
+class TokenUsage:
+    """累计的token用量，可在多个线程中同时记录"""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def record(self, usage):
+        """记录一次API响应的 usage（openai 的 CompletionUsage），usage 为 None 时只计请求数"""
+        with self._lock:
+            self.requests += 1
+            if usage is None:
+                return
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+            details = getattr(usage, "prompt_tokens_details", None)
+            self.cached_tokens += (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+
+class TokenLedger:
+    """一个文档（任务）的token用量和预算
+
+    每次发送请求前用估算的输入和输出token数调用 reserve 预留额度：已记录的用量、尚未返回的请求
+    预留的额度与本次估算值之和超过 budget 时返回 False，并且之后不再放行任何请求，剩余的文本单元
+    由调用方记录为未检查。请求返回后调用 record（失败时调用 release）以实际用量结清预留的额度。
+    并行发送请求时预算也不会因为同时在途的请求被超出；实际用量与估算值的差异，以及未预留额度的
+    对冲请求（用 record_discarded 记录），仍可能使总用量略超预算。
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or None
+        self.usage = TokenUsage()
+        self.estimated_prompt_tokens = 0
+        # 已放行、尚未返回的请求预留的token数
+        self.reserved_tokens = 0
+        self.exhausted = False
+        # 每个文本单元的用量：位置、估算的输入token数和实际用量
+        self.units = []
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated_prompt_tokens, estimated_completion_tokens=0):
+        """为一次请求预留额度，预算不足时返回 False"""
+        estimated_tokens = estimated_prompt_tokens + estimated_completion_tokens
+        with self._lock:
+            if self.exhausted:
+                return False
+            if (self.budget is not None
+                    and self.usage.total_tokens + self.reserved_tokens + estimated_tokens > self.budget):
+                self.exhausted = True
+                return False
+            self.reserved_tokens += estimated_tokens
+            return True
+
+    def release(self, estimated_prompt_tokens, estimated_completion_tokens=0):
+        """释放请求失败时预留的额度"""
+        with self._lock:
+            self.reserved_tokens -= estimated_prompt_tokens + estimated_completion_tokens
+
+    def record(self, location, estimated_prompt_tokens, usage, estimated_completion_tokens=0):
+        """记录一次请求的实际用量，并释放为它预留的额度"""
+        self.usage.record(usage)
+        with self._lock:
+            self.reserved_tokens -= estimated_prompt_tokens + estimated_completion_tokens
+            self.estimated_prompt_tokens += estimated_prompt_tokens
+            self.units.append({
+                "location": location,
+                "estimated_prompt_tokens": estimated_prompt_tokens,
+                "prompt_tokens": usage.prompt_tokens if usage is not None else None,
+                "completion_tokens": usage.completion_tokens if usage is not None else None,
+            })
+
+    def record_discarded(self, location, usage):
+        """记录一次未被采用的对冲请求（或被对冲请求抢先的主请求）的实际用量
+
+        这类请求同样计费，但没有为它预留额度，也不对应估算值。
+        """
+        self.usage.record(usage)
+        with self._lock:
+            self.units.append({
+                "location": location,
+                "discarded": True,
+                "prompt_tokens": usage.prompt_tokens if usage is not None else None,
+                "completion_tokens": usage.completion_tokens if usage is not None else None,
+            })
+
+    def summary(self):
+        """不含逐个文本单元明细的用量汇总"""
+        result = self.usage.to_dict()
+        result["estimated_prompt_tokens"] = self.estimated_prompt_tokens
+        result["budget"] = self.budget
+        result["budget_exhausted"] = self.exhausted
+        return result
+
+    def to_dict(self):
+        result = self.summary()
+        result["units"] = self.units
+        return result
+
+
+# 本进程中所有API响应（包括未被采用的对冲请求）的累计用量
+process_usage = TokenUsage()
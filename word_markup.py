@@ -0,0 +1,205 @@
+import copy
+from datetime import datetime, timezone
+
+from docx.oxml import OxmlElement, parse_xml
+from docx.shared import RGBColor
+from docx.text.run import Run
+from lxml import etree
+
+from ooxml_reader import W_NS, word_run_text
+
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+# 批注作者
+COMMENT_AUTHOR = "校对助手"
+COMMENT_INITIALS = "AI"
+
+
+def _w(tag):
+    return f"{{{W_NS}}}{tag}"
+
+
+# 在 Run.text 中各占一个字符的运行内容元素
+_SINGLE_CHAR_TAGS = {_w("tab"), _w("ptab"), _w("cr"), _w("noBreakHyphen")}
+
+
+def _content_length(child):
+    """运行中某个内容元素对应的文本长度，与 python-docx 的 Run.text 保持一致"""
+    if child.tag == _w("t"):
+        return len(child.text or "")
+    if child.tag in _SINGLE_CHAR_TAGS:
+        return 1
+    if child.tag == _w("br"):
+        return 1 if child.get(_w("type"), "textWrapping") == "textWrapping" else 0
+    return 0
+
+
+def _truncate_run(r, start, end=None):
+    """只保留运行中 [start, end) 范围内的内容，格式属性（w:rPr）保持不变"""
+    pos = 0
+    for child in list(r):
+        if child.tag == _w("rPr"):
+            continue
+
+        length = _content_length(child)
+        child_end = pos + length
+        if length == 0:
+            keep = pos >= start and (end is None or pos < end)
+            if not keep:
+                r.remove(child)
+        elif child_end <= start or (end is not None and pos >= end):
+            r.remove(child)
+        elif child.tag == _w("t"):
+            # 文本元素可能只有一部分落在范围内
+            cut_start = max(start - pos, 0)
+            cut_end = length if end is None else min(end - pos, length)
+            child.text = child.text[cut_start:cut_end]
+            child.set(XML_SPACE, "preserve")
+        pos = child_end
+
+
+def split_run(r, offset):
+    """在运行的第 offset 个字符处拆分运行，返回拆分出的右半部分（紧跟在 r 之后）"""
+    right = copy.deepcopy(r)
+    r.addnext(right)
+    _truncate_run(r, 0, offset)
+    _truncate_run(right, offset)
+    return right
+
+
+def paragraph_runs(p):
+    """按文档顺序返回段落中参与 Paragraph.text 的运行（包括超链接中的运行）"""
+    return p.xpath("./w:r | ./w:hyperlink/w:r")
+
+
+def isolate_range(p, start, end):
+    """拆分段落中 [start, end) 边界处的运行，返回恰好覆盖该范围的运行元素列表
+
+    只有落在边界上的运行会被拆分，段落中的其他运行保持不变。
+    """
+    covered = []
+    pos = 0
+    for r in paragraph_runs(p):
+        length = len(word_run_text(r))
+        run_start, run_end = pos, pos + length
+        pos = run_end
+        if length == 0 or run_end <= start or run_start >= end:
+            continue
+
+        if run_start < start:
+            r = split_run(r, start - run_start)
+            run_start = start
+        if run_end > end:
+            split_run(r, end - run_start)
+        covered.append(r)
+    return covered
+
+
+def _new_run_like(template_run, text):
+    """新建一个包含 text 的运行，格式（w:rPr）沿用 template_run"""
+    r = OxmlElement("w:r")
+    r_pr = template_run.find(_w("rPr"))
+    if r_pr is not None:
+        r.append(copy.deepcopy(r_pr))
+    t = OxmlElement("w:t")
+    t.text = text
+    t.set(XML_SPACE, "preserve")
+    r.append(t)
+    return r
+
+
+def rewrite_inline(p, spans):
+    """在段落中需要修改的原文外加方括号，并在其后添加红色建议
+
+    spans 为按位置排列、互不重叠的 (起始位置, 结束位置, 建议)，位置是段落文本中的字符位置。
+    只拆分建议所在的运行，段落属性和其他运行保持不变；方括号和建议沿用原文的格式，建议改为红色。
+    """
+    # 从后往前写入，已插入的内容不会影响前面原文的位置
+    for start, end, suggestion in reversed(spans):
+        runs = isolate_range(p, start, end)
+        if not runs:
+            continue
+
+        runs[0].addprevious(_new_run_like(runs[0], "["))
+        closing = _new_run_like(runs[-1], "]")
+        runs[-1].addnext(closing)
+
+        suggestion_run = _new_run_like(runs[-1], f"({suggestion})")
+        color = suggestion_run.get_or_add_rPr().get_or_add_color()
+        color.val = RGBColor(255, 0, 0)
+        color.themeColor = None
+        closing.addnext(suggestion_run)
+
+
+def rewrite_paragraph_xml(p_xml, spans):
+    """rewrite_inline 的序列化版本：接收并返回段落的XML，可以在进程池中运行"""
+    p = parse_xml(p_xml)
+    rewrite_inline(p, spans)
+    return etree.tostring(p)
+
+
+def add_word_comments(document, paragraph, spans):
+    """把建议作为Word原生批注附加到段落中对应的原文上，正文文本保持不变"""
+    for start, end, suggestion in spans:
+        runs = isolate_range(paragraph._p, start, end)
+        if runs:
+            document.add_comment(
+                [Run(r, paragraph) for r in runs],
+                text=f"建议修改为：{suggestion}",
+                author=COMMENT_AUTHOR,
+                initials=COMMENT_INITIALS,
+            )
+
+
+class RevisionWriter:
+    """把建议写成Word修订（w:del/w:ins），审阅者可以在Word中逐条接受或拒绝
+
+    只拆分建议所在的运行：原文运行移入 w:del，建议文本作为沿用原格式的新运行放入 w:ins。
+    """
+
+    def __init__(self, document, author=COMMENT_AUTHOR, date=None):
+        self.author = author
+        self.date = date or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        # 修订编号在文档内必须唯一，从已有修订的最大编号之后开始分配
+        existing_ids = [
+            int(value) for value in document.element.body.xpath("(.//w:ins | .//w:del)/@w:id")
+            if value.isdigit()
+        ]
+        self._next_id = max(existing_ids, default=0) + 1
+
+    def _new_revision_element(self, tag):
+        element = OxmlElement(tag)
+        element.set(_w("id"), str(self._next_id))
+        element.set(_w("author"), self.author)
+        element.set(_w("date"), self.date)
+        self._next_id += 1
+        return element
+
+    def _delete_runs(self, runs):
+        """把运行移入 w:del，同一父元素下的连续运行共用一个 w:del，返回最后一个 w:del"""
+        deletion = None
+        for r in runs:
+            if deletion is None or deletion.getparent() is not r.getparent():
+                deletion = self._new_revision_element("w:del")
+                r.addprevious(deletion)
+            deletion.append(r)
+            for t in r.iterchildren(_w("t")):
+                t.tag = _w("delText")
+            for instr in r.iterchildren(_w("instrText")):
+                instr.tag = _w("delInstrText")
+        return deletion
+
+    def _insert_text_after(self, element, template_run, text):
+        """在 element 之后插入修订文本，格式沿用 template_run"""
+        insertion = self._new_revision_element("w:ins")
+        insertion.append(_new_run_like(template_run, text))
+        element.addnext(insertion)
+
+    def apply(self, paragraph, spans):
+        # 从后往前写入修订，已写入的修订不会影响前面原文的位置
+        for start, end, suggestion in reversed(spans):
+            runs = isolate_range(paragraph._p, start, end)
+            if runs:
+                deletion = self._delete_runs(runs)
+                if suggestion:
+                    self._insert_text_after(deletion, runs[-1], suggestion)
@@ -0,0 +1,100 @@
+import multiprocessing
+import queue
+
+# 工作进程发回的消息类型
+MESSAGE_PROGRESS = "progress"
+MESSAGE_RESULT = "result"
+MESSAGE_DONE = "done"
+MESSAGE_ERROR = "error"
+MESSAGE_CANCELLED = "cancelled"
+
+# 表示处理已经结束的消息类型
+FINAL_MESSAGES = (MESSAGE_DONE, MESSAGE_ERROR, MESSAGE_CANCELLED)
+
+
+def _worker_main(file_path, options, messages, cancel_event):
+    """工作进程入口：处理文档，并通过队列发回进度、结果和最终状态"""
+    from office_processor import process_document, new_token_ledger, ProcessingCancelled
+
+    def progress_callback(percent, message):
+        messages.put({"type": MESSAGE_PROGRESS, "percent": percent, "message": message})
+
+    def row_callback(location, original, suggestion, status):
+        messages.put({"type": MESSAGE_RESULT, "location": location, "original": original,
+                      "suggestion": suggestion, "status": status})
+
+    token_ledger = new_token_ledger()
+    try:
+        output_path = process_document(file_path, progress_callback,
+                                       cancel_event=cancel_event,
+                                       row_callback=row_callback,
+                                       token_ledger=token_ledger,
+                                       **options)
+        messages.put({"type": MESSAGE_DONE, "output_path": str(output_path),
+                      "tokens": token_ledger.usage.total_tokens})
+    except ProcessingCancelled:
+        messages.put({"type": MESSAGE_CANCELLED})
+    except Exception as e:
+        messages.put({"type": MESSAGE_ERROR, "message": str(e)})
+
+
+class WorkerProcess:
+    """在独立进程中运行 process_document
+
+    文档解析和重建都在工作进程中进行，不与界面进程争用GIL。
+    进度、结果和错误以字典消息的形式通过队列传回，取消通过共享的 Event 协作完成。
+    """
+
+    def __init__(self, file_path, **options):
+        # 使用 spawn 启动方式，避免在已经启动线程的界面进程中 fork
+        context = multiprocessing.get_context("spawn")
+        self.messages = context.Queue()
+        self.cancel_event = context.Event()
+        # 工作进程需要创建进程池并行重建段落，因此不能是守护进程；退出界面时由 terminate 结束
+        self.process = context.Process(
+            target=_worker_main,
+            args=(str(file_path), options, self.messages, self.cancel_event),
+        )
+
+    def start(self):
+        self.process.start()
+
+    def cancel(self):
+        """请求工作进程在处理下一个文本单元前停止"""
+        self.cancel_event.set()
+
+    def terminate(self):
+        """立即结束工作进程（用于退出程序）"""
+        self.cancel_event.set()
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def iter_messages(self, poll_interval=0.2):
+        """依次返回工作进程发来的消息，直到收到最终消息
+
+        工作进程异常退出（没有发出最终消息）时，返回一条错误消息。
+        """
+        while True:
+            try:
+                message = self.messages.get(timeout=poll_interval)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    # 进程已退出，取走退出前可能刚放入队列的消息
+                    try:
+                        message = self.messages.get(timeout=poll_interval)
+                    except queue.Empty:
+                        yield {"type": MESSAGE_ERROR,
+                               "message": f"处理进程意外退出（退出码 {self.process.exitcode}）"}
+                        return
+                else:
+                    continue
+
+            yield message
+            if message["type"] in FINAL_MESSAGES:
+                return
+
+    def join(self, timeout=None):
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
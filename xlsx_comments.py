@@ -0,0 +1,380 @@
+import posixpath
+import re
+import shutil
+import zipfile
+
+from lxml import etree
+from openpyxl.utils import coordinate_to_tuple
+
+from ooxml_reader import PKG_REL_NS, R_NS
+
+# 命名空间和关系类型
+S_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+V_NS = "urn:schemas-microsoft-com:vml"
+O_NS = "urn:schemas-microsoft-com:office:office"
+X_NS = "urn:schemas-microsoft-com:office:excel"
+REL_WORKSHEET = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+REL_COMMENTS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/comments"
+REL_VML = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/vmlDrawing"
+COMMENTS_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.comments+xml"
+VML_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.vmlDrawing"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+COMMENT_AUTHOR = "校对助手"
+
+# 工作表XML中排在 legacyDrawing 之后的顶层元素（CT_Worksheet 的元素顺序）
+_AFTER_LEGACY_DRAWING = {"legacyDrawingHF", "drawingHF", "picture", "oleObjects", "controls",
+                         "webPublishItems", "tableParts", "extLst", "AlternateContent"}
+_SHEET_DATA_END = re.compile(rb"</(?:[\w.-]+:)?sheetData\s*>|<(?:[\w.-]+:)?sheetData\b[^>]*/>")
+_ROOT_START = re.compile(rb"<(?:[\w.-]+:)?worksheet\b[^>]*>")
+_CHUNK_SIZE = 1 << 20
+
+# VML中每个 o:idmap 编号对应1024个形状编号
+_SHAPES_PER_BLOCK = 1024
+
+
+def _s(tag):
+    return f"{{{S_NS}}}{tag}"
+
+
+def _local_name(element):
+    return etree.QName(element).localname if isinstance(element.tag, str) else None
+
+
+def _rels_path(part_name):
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+
+def _resolve_target(source_part, target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+def _read_rels(package, part_name):
+    """返回部件的关系列表 (Id, Type, 目标部件名)，没有关系文件时返回空列表"""
+    path = _rels_path(part_name)
+    if path not in package.namelist():
+        return []
+    rels = etree.fromstring(package.read(path))
+    return [
+        (rel.get("Id"), rel.get("Type"), _resolve_target(part_name, rel.get("Target")))
+        for rel in rels.iterchildren(f"{{{PKG_REL_NS}}}Relationship")
+        if rel.get("TargetMode") != "External"
+    ]
+
+
+def worksheet_part_names(package):
+    """返回 {工作表名称: 工作表部件名}，不包括图表工作表"""
+    workbook = etree.fromstring(package.read("xl/workbook.xml"))
+    targets = {rel_id: target for rel_id, rel_type, target in _read_rels(package, "xl/workbook.xml")
+               if rel_type == REL_WORKSHEET}
+    sheets = workbook.find(_s("sheets"))
+    return {
+        sheet.get("name"): targets[sheet.get(f"{{{R_NS}}}id")]
+        for sheet in (sheets if sheets is not None else [])
+        if sheet.get(f"{{{R_NS}}}id") in targets
+    }
+
+
+def _unused_part_name(names, pattern):
+    index = 1
+    while pattern.format(index) in names:
+        index += 1
+    name = pattern.format(index)
+    names.add(name)
+    return name
+
+
+def _next_rel_id(rels):
+    used = {rel_id for rel_id, _, _ in rels}
+    index = len(used) + 1
+    while f"rId{index}" in used:
+        index += 1
+    return f"rId{index}"
+
+
+def _parse_vml(data):
+    # Excel生成的VML不一定是严格的XML
+    return etree.fromstring(data, etree.XMLParser(recover=True))
+
+
+def _new_vml(idmap):
+    root = etree.Element("xml", nsmap={"v": V_NS, "o": O_NS, "x": X_NS})
+    layout = etree.SubElement(root, f"{{{O_NS}}}shapelayout", {f"{{{V_NS}}}ext": "edit"})
+    etree.SubElement(layout, f"{{{O_NS}}}idmap", {f"{{{V_NS}}}ext": "edit", "data": idmap})
+    shape_type = etree.SubElement(root, f"{{{V_NS}}}shapetype", {
+        "id": "_x0000_t202", "coordsize": "21600,21600", f"{{{O_NS}}}spt": "202",
+        "path": "m,l,21600r21600,l21600,xe",
+    })
+    etree.SubElement(shape_type, f"{{{V_NS}}}stroke", {"joinstyle": "miter"})
+    etree.SubElement(shape_type, f"{{{V_NS}}}path", {"gradientshapeok": "t", f"{{{O_NS}}}connecttype": "rect"})
+    return root
+
+
+def _add_vml_shape(root, shape_id, row, column):
+    """添加一个批注形状，row、column 从0开始"""
+    shape = etree.SubElement(root, f"{{{V_NS}}}shape", {
+        "id": f"_x0000_s{shape_id}", "type": "#_x0000_t202",
+        "style": "position:absolute;margin-left:59.25pt;margin-top:1.5pt;width:144pt;height:79pt;"
+                 "z-index:1;visibility:hidden",
+        "fillcolor": "#ffffe1", f"{{{O_NS}}}insetmode": "auto",
+    })
+    etree.SubElement(shape, f"{{{V_NS}}}fill", {"color2": "#ffffe1"})
+    etree.SubElement(shape, f"{{{V_NS}}}shadow", {"color": "black", "obscured": "t"})
+    etree.SubElement(shape, f"{{{V_NS}}}path", {f"{{{O_NS}}}connecttype": "none"})
+    textbox = etree.SubElement(shape, f"{{{V_NS}}}textbox", {"style": "mso-direction-alt:auto"})
+    etree.SubElement(textbox, "div", {"style": "text-align:left"})
+    client_data = etree.SubElement(shape, f"{{{X_NS}}}ClientData", {"ObjectType": "Note"})
+    etree.SubElement(client_data, f"{{{X_NS}}}MoveWithCells")
+    etree.SubElement(client_data, f"{{{X_NS}}}SizeWithCells")
+    etree.SubElement(client_data, f"{{{X_NS}}}AutoFill").text = "False"
+    etree.SubElement(client_data, f"{{{X_NS}}}Row").text = str(row)
+    etree.SubElement(client_data, f"{{{X_NS}}}Column").text = str(column)
+
+
+def _vml_idmap_blocks(root):
+    idmap = root.find(f"{{{O_NS}}}shapelayout/{{{O_NS}}}idmap")
+    if idmap is None:
+        return []
+    return [int(block) for block in re.findall(r"\d+", idmap.get("data", ""))]
+
+
+def _set_vml_idmap(root, blocks):
+    layout = root.find(f"{{{O_NS}}}shapelayout")
+    if layout is None:
+        layout = etree.Element(f"{{{O_NS}}}shapelayout", {f"{{{V_NS}}}ext": "edit"})
+        root.insert(0, layout)
+    idmap = layout.find(f"{{{O_NS}}}idmap")
+    if idmap is None:
+        idmap = etree.SubElement(layout, f"{{{O_NS}}}idmap", {f"{{{V_NS}}}ext": "edit"})
+    idmap.set("data", ",".join(str(block) for block in blocks))
+
+
+def _comment_text(text):
+    text_element = etree.Element(_s("text"))
+    t = etree.SubElement(text_element, _s("t"))
+    t.text = text
+    t.set(XML_SPACE, "preserve")
+    return text_element
+
+
+def _append_comment_text(comment, text):
+    """在已有批注的文本后追加一段文本（作为新的文本运行）"""
+    text_element = comment.find(_s("text"))
+    if text_element is None:
+        comment.append(_comment_text(text))
+        return
+    run = etree.Element(_s("r"))
+    t = etree.SubElement(run, _s("t"))
+    t.text = "\n\n" + text
+    t.set(XML_SPACE, "preserve")
+    # 文本运行排在 t 和已有的 r 之后、注音（rPh、phoneticPr）之前
+    last = None
+    for child in text_element:
+        if _local_name(child) in ("t", "r"):
+            last = child
+    if last is None:
+        text_element.insert(0, run)
+    else:
+        last.addnext(run)
+
+
+def _copy_info(info):
+    """复制压缩包条目的元数据（写入时 ZipFile 会修改传入的 ZipInfo）"""
+    copied = zipfile.ZipInfo(info.filename, info.date_time)
+    copied.compress_type = info.compress_type
+    copied.external_attr = info.external_attr
+    copied.create_system = info.create_system
+    return copied
+
+
+def _copy_sheet_with_legacy_drawing(source, target, rel_id):
+    """流式复制工作表XML，只在 sheetData 之后的部分插入 legacyDrawing 元素
+
+    单元格数据（sheetData）按原字节复制，不解析；sheetData 之后只有合并单元格、超链接、
+    数据验证、页面设置等少量元素，读入内存后按元素顺序插入 legacyDrawing。
+    """
+    head = b""
+    root_start = None
+    while True:
+        chunk = source.read(_CHUNK_SIZE)
+        if not chunk:
+            raise ValueError("工作表XML中没有找到 sheetData")
+        head += chunk
+        if root_start is None:
+            match = _ROOT_START.search(head)
+            if match:
+                root_start = match.group(0)
+        match = _SHEET_DATA_END.search(head)
+        if match:
+            target.write(head[:match.end()])
+            tail = head[match.end():] + source.read()
+            break
+        # 保留末尾一小段，避免结束标签被拆在两个块之间
+        keep = 64
+        target.write(head[:-keep])
+        head = head[-keep:]
+
+    root = etree.fromstring(root_start + tail)
+    namespace = etree.QName(root).namespace
+    legacy_drawing = etree.Element(f"{{{namespace}}}legacyDrawing" if namespace else "legacyDrawing",
+                                   nsmap={"r": R_NS})
+    legacy_drawing.set(f"{{{R_NS}}}id", rel_id)
+    for child in root:
+        if _local_name(child) in _AFTER_LEGACY_DRAWING:
+            child.addprevious(legacy_drawing)
+            break
+    else:
+        root.append(legacy_drawing)
+
+    # 输出根元素的文本和子元素，根元素的开始和结束标签沿用原文
+    closing = re.search(rb"</(?:[\w.-]+:)?worksheet\s*>\s*$", tail)
+    parts = [(root.text or "").encode("utf-8")]
+    parts.extend(etree.tostring(child, encoding="utf-8") for child in root)
+    target.write(b"".join(parts))
+    target.write(closing.group(0) if closing else b"</worksheet>")
+
+
+def write_commented_workbook(source_path, target_path, annotations, author=COMMENT_AUTHOR):
+    """复制工作簿，并把批注添加到指定单元格
+
+    annotations 为 {工作表名称: [(单元格坐标, 批注文本), ...]}。除批注外，工作簿中的其他部件
+    （单元格数据、样式、隐藏状态、冻结窗格、行高列宽、超链接、数据验证、图表、图片等）按原样复制；
+    单元格已有批注时，在原批注文本后追加。只有需要添加批注的工作表的XML会被改动：
+    没有批注的工作表需要在 sheetData 之后插入一个 legacyDrawing 元素。
+    """
+    with zipfile.ZipFile(source_path) as package:
+        names = set(package.namelist())
+        sheet_parts = worksheet_part_names(package)
+        # 修改后的部件内容，以及工作表XML中需要插入的 legacyDrawing 关系编号
+        replaced = {}
+        legacy_drawings = {}
+
+        # 已有VML中使用的 idmap 编号，新的VML使用之后的编号
+        next_block = 1
+        for name in names:
+            if name.lower().endswith(".vml"):
+                blocks = _vml_idmap_blocks(_parse_vml(package.read(name)))
+                next_block = max([next_block] + [block + 1 for block in blocks])
+
+        content_types = etree.fromstring(package.read("[Content_Types].xml"))
+
+        for sheet_name, cell_comments in annotations.items():
+            if not cell_comments or sheet_name not in sheet_parts:
+                continue
+            sheet_part = sheet_parts[sheet_name]
+            rels = _read_rels(package, sheet_part)
+            comments_part = next((target for _, rel_type, target in rels if rel_type == REL_COMMENTS), None)
+            vml_part = next((target for _, rel_type, target in rels if rel_type == REL_VML), None)
+            new_rels = []
+
+            if comments_part is not None and comments_part in names:
+                comments = etree.fromstring(package.read(comments_part))
+            else:
+                comments_part = _unused_part_name(names, "xl/comments{}.xml")
+                comments = etree.fromstring(
+                    f'<comments xmlns="{S_NS}"><authors/><commentList/></comments>'.encode())
+                new_rels.append((REL_COMMENTS, comments_part))
+                etree.SubElement(content_types, f"{{{CT_NS}}}Override", {
+                    "PartName": f"/{comments_part}", "ContentType": COMMENTS_CONTENT_TYPE})
+
+            if vml_part is not None and vml_part in names:
+                vml = _parse_vml(package.read(vml_part))
+            else:
+                vml_part = _unused_part_name(names, "xl/drawings/vmlDrawing{}.vml")
+                vml = _new_vml(str(next_block))
+                next_block += 1
+                new_rels.append((REL_VML, vml_part))
+
+            authors = comments.find(_s("authors"))
+            if authors is None:
+                authors = etree.Element(_s("authors"))
+                comments.insert(0, authors)
+            author_names = [element.text for element in authors]
+            if author not in author_names:
+                etree.SubElement(authors, _s("author")).text = author
+                author_names.append(author)
+            author_id = str(author_names.index(author))
+
+            comment_list = comments.find(_s("commentList"))
+            if comment_list is None:
+                comment_list = etree.SubElement(comments, _s("commentList"))
+            existing = {comment.get("ref"): comment for comment in comment_list}
+
+            # 新批注的形状编号排在已有形状之后，超出 idmap 范围时追加编号块
+            shape_ids = [int(number) for number in
+                         re.findall(r"_x0000_s(\d+)", etree.tostring(vml).decode("utf-8", "replace"))]
+            blocks = _vml_idmap_blocks(vml)
+            if not blocks:
+                blocks = [next_block]
+                next_block += 1
+            next_shape_id = max(shape_ids + [blocks[0] * _SHAPES_PER_BLOCK + 1]) + 1
+
+            for coordinate, text in cell_comments:
+                if coordinate in existing:
+                    _append_comment_text(existing[coordinate], text)
+                    continue
+                comment = etree.SubElement(comment_list, _s("comment"), {"ref": coordinate, "authorId": author_id})
+                comment.append(_comment_text(text))
+                existing[coordinate] = comment
+
+                while next_shape_id >= (max(blocks) + 1) * _SHAPES_PER_BLOCK:
+                    blocks.append(next_block)
+                    next_shape_id = next_block * _SHAPES_PER_BLOCK + 2
+                    next_block += 1
+                row, column = coordinate_to_tuple(coordinate)
+                _add_vml_shape(vml, next_shape_id, row - 1, column - 1)
+                next_shape_id += 1
+            _set_vml_idmap(vml, blocks)
+
+            replaced[comments_part] = etree.tostring(comments, xml_declaration=True, encoding="UTF-8",
+                                                     standalone=True)
+            replaced[vml_part] = etree.tostring(vml, encoding="utf-8")
+
+            if new_rels:
+                rels_path = _rels_path(sheet_part)
+                if rels_path in package.namelist():
+                    rels_root = etree.fromstring(package.read(rels_path))
+                else:
+                    rels_root = etree.Element(f"{{{PKG_REL_NS}}}Relationships", nsmap={None: PKG_REL_NS})
+                    names.add(rels_path)
+                for rel_type, target in new_rels:
+                    rel_id = _next_rel_id(rels)
+                    rels.append((rel_id, rel_type, target))
+                    etree.SubElement(rels_root, f"{{{PKG_REL_NS}}}Relationship", {
+                        "Id": rel_id, "Type": rel_type,
+                        "Target": posixpath.relpath(target, posixpath.dirname(sheet_part)),
+                    })
+                    if rel_type == REL_VML:
+                        legacy_drawings[sheet_part] = rel_id
+                replaced[rels_path] = etree.tostring(rels_root, xml_declaration=True, encoding="UTF-8",
+                                                     standalone=True)
+
+        if replaced:
+            has_vml_default = any(
+                element.get("Extension", "").lower() == "vml"
+                for element in content_types.iterchildren(f"{{{CT_NS}}}Default"))
+            if not has_vml_default:
+                content_types.insert(0, etree.Element(f"{{{CT_NS}}}Default", {
+                    "Extension": "vml", "ContentType": VML_CONTENT_TYPE}))
+            replaced["[Content_Types].xml"] = etree.tostring(content_types, xml_declaration=True,
+                                                             encoding="UTF-8", standalone=True)
+
+        with zipfile.ZipFile(target_path, "w", zipfile.ZIP_DEFLATED) as output:
+            written = set()
+            for info in package.infolist():
+                written.add(info.filename)
+                if info.filename in replaced:
+                    output.writestr(_copy_info(info), replaced[info.filename], compress_type=zipfile.ZIP_DEFLATED)
+                elif info.filename in legacy_drawings:
+                    with package.open(info) as source, output.open(_copy_info(info), "w") as target:
+                        _copy_sheet_with_legacy_drawing(source, target, legacy_drawings[info.filename])
+                else:
+                    with package.open(info) as source, output.open(_copy_info(info), "w") as target:
+                        shutil.copyfileobj(source, target, _CHUNK_SIZE)
+            for name, data in replaced.items():
+                if name not in written:
+                    output.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED)